@@ -0,0 +1,108 @@
+"""
+Compare the flow-based and direct model generation backends offline.
+
+Both backends are driven through their stubbable clients, so no AWS access is
+needed: the stubs sleep for the given service latencies and return a canned
+completion. The reported time is the stubbed latency plus everything the
+backend does on the client side (prompt rendering, stream handling, caching).
+
+Usage (from the repository root):
+    PYTHONPATH=. python scripts/benchmark_generation_backends.py \
+        --iterations 20 --model-latency-ms 800 --flow-overhead-ms 300
+"""
+
+import argparse
+import statistics
+import time
+from src.pipeline.bedrock_flow import BedrockFlow
+from src.pipeline.generation_backend import (
+    FlowGenerationBackend,
+    ModelGenerationBackend,
+)
+from src.pipeline.kendra_flow import IC_DECK_SECTIONS
+
+# Canned model completion returned by both stubs
+COMPLETION = "1. Section\n- Generated content for the benchmark"
+
+
+class StubFlowRuntime:
+    """Stands in for the bedrock-agent-runtime client."""
+
+    def __init__(self, latency_seconds: float):
+        self.latency_seconds = latency_seconds
+
+    def invoke_flow(self, **kwargs):
+        time.sleep(self.latency_seconds)
+        return {
+            "responseStream": [
+                {
+                    "flowOutputEvent": {
+                        "nodeName": "FinalOutput",
+                        "content": {"document": COMPLETION},
+                    }
+                },
+                {"flowCompletionEvent": {"completionReason": "SUCCESS"}},
+            ]
+        }
+
+
+class StubModelRuntime:
+    """Stands in for the bedrock-runtime client."""
+
+    def __init__(self, latency_seconds: float):
+        self.latency_seconds = latency_seconds
+
+    def converse(self, **kwargs):
+        time.sleep(self.latency_seconds)
+        return {"output": {"message": {"content": [{"text": COMPLETION}]}}}
+
+
+def benchmark(backend, input_data: str, iterations: int):
+    """Generate every section `iterations` times and return the latencies in ms."""
+    latencies = []
+    for _ in range(iterations):
+        for section in IC_DECK_SECTIONS.values():
+            start_time = time.perf_counter()
+            backend.generate(section, input_data)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--model-latency-ms", type=float, default=0.0)
+    parser.add_argument("--flow-overhead-ms", type=float, default=0.0)
+    parser.add_argument("--input-chars", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Stubbed flow ids so the flow backend can address every section
+    for section in IC_DECK_SECTIONS.values():
+        section.flow_id = section.flow_id or "stub-flow"
+        section.flow_alias_id = section.flow_alias_id or "stub-alias"
+
+    model_latency = args.model_latency_ms / 1000
+    backends = {
+        "flow": FlowGenerationBackend(
+            BedrockFlow(
+                runtime_client=StubFlowRuntime(
+                    model_latency + args.flow_overhead_ms / 1000
+                )
+            )
+        ),
+        "model": ModelGenerationBackend(runtime_client=StubModelRuntime(model_latency)),
+    }
+
+    input_data = "x" * args.input_chars
+    for name, backend in backends.items():
+        latencies = sorted(benchmark(backend, input_data, args.iterations))
+        print(
+            f"{name:>5}: mean {statistics.mean(latencies):.2f} ms, "
+            f"p50 {latencies[len(latencies) // 2]:.2f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms "
+            f"over {len(latencies)} sections"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measure the cost of the passage reranker and how much it shrinks a prompt.
+
+A synthetic candidate set is generated for every IC deck section: passages of
+random vocabulary, some of which mention the terms of the section's queries.
+For each section the script times the rerank stage and compares the packed
+context with and without it.
+
+Usage (from the repository root):
+    PYTHONPATH=. python scripts/benchmark_reranker.py --passages 150 --top-k 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+from src.pipeline.context_packer import ContextPacker
+from src.pipeline.kendra_flow import IC_DECK_SECTIONS
+from src.pipeline.reranker import PassageReranker
+
+
+def make_passages(queries, count: int, words_per_passage: int, rng: random.Random):
+    """Build synthetic passages, a quarter of which mention query terms."""
+    vocabulary = [f"term{i}" for i in range(5000)]
+    query_words = [word for query in queries for word in query.lower().split()]
+    passages = []
+    for index in range(count):
+        words = rng.choices(vocabulary, k=words_per_passage)
+        if index % 4 == 0:
+            words[: len(words) // 5] = rng.choices(query_words, k=len(words) // 5)
+        passages.append(
+            {
+                "content": " ".join(words),
+                "document_uri": f"s3://bucket/doc{index % 12}.pdf",
+            }
+        )
+    return passages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--passages", type=int, default=150)
+    parser.add_argument("--words", type=int, default=120)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    reranker = PassageReranker(top_k=args.top_k)
+    # No budget limit, so the packed size reflects the passages kept
+    packer = ContextPacker(token_budget=10**9)
+
+    for name, section in IC_DECK_SECTIONS.items():
+        passages = make_passages(section.kendra_queries, args.passages, args.words, rng)
+
+        latencies = []
+        for _ in range(args.iterations):
+            start_time = time.perf_counter()
+            reranked = reranker.rerank(passages, section.kendra_queries)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+        before = packer.pack(passages, section.kendra_queries).tokens_used
+        after = packer.pack(reranked, section.kendra_queries).tokens_used
+        print(
+            f"{name}: rerank {statistics.median(latencies):.2f} ms median "
+            f"over {len(passages)} passages and {len(section.kendra_queries)} queries, "
+            f"prompt {before} -> {after} tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Build the offline retrieval index used when RETRIEVAL_BACKEND=local.
+
+PDFs inside client_<name>/ folders are indexed for client <name>, all other
+PDFs for a client named after the source folder.
+
+Usage (from the repository root):
+    PYTHONPATH=. python scripts/build_local_index.py demo/sample_input \
+        --index-path /tmp/local_retrieval_index
+"""
+
+import argparse
+import time
+from src.pipeline.local_retriever import LocalRetriever
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source_dir", nargs="?", default="demo/sample_input")
+    parser.add_argument("--index-path", default=None)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    retriever = LocalRetriever.build(args.source_dir)
+    retriever.save(args.index_path)
+    print(
+        f"Indexed {len(retriever.passages)} passages and {len(retriever.terms)} terms "
+        f"for clients {', '.join(retriever.clients)} "
+        f"in {time.perf_counter() - start_time:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Check that map-reduce generation keeps the reference numbers of the drafts.
+
+A stub retriever returns more passages than fit one context, so the section is
+drafted from several chunks and the drafts are merged with the reduce prompt.
+The stub model cites every reference of the excerpt it is given and merges
+drafts by keeping their points and the references listed in its input. The
+script checks that every merge used the reduce prompt, that each merge input
+lists every number its drafts cite with the document that number had in the
+excerpts, and that the final section cites every document of the excerpts
+under its original number. It exits with status 1 otherwise.
+
+Usage (from the repository root):
+    PYTHONPATH=. python scripts/check_map_reduce_references.py --documents 30
+"""
+
+import argparse
+import re
+import sys
+from src.pipeline.context_packer import ContextPacker
+from src.pipeline.generation_backend import ModelGenerationBackend
+from src.pipeline.kendra_flow import ICDeckProcessor, ICDeckSection
+from scripts.stubs import StubRetriever
+
+# Start of the reduce prompt, telling merges apart from map calls
+REDUCE_MARKER = "Merge partial drafts"
+
+# "[3] s3://..." lines of a reference list, the last one followed by the rest of
+# the prompt sentence, and "3. s3://..." lines of a draft
+REFERENCE_LINE = re.compile(r"^\[(\d+)\] (\S+?)\.?(?: |$)", re.MULTILINE)
+DRAFT_REFERENCE_LINE = re.compile(r"^(\d+)\. (\S+)$", re.MULTILINE)
+
+
+def document_passages(documents: int):
+    """Return a passage source giving query n two passages of every third document from n."""
+
+    def passages(query_text, page_number):
+        query = int(query_text.split()[-1])
+        for document in range(query, documents, 3):
+            for passage in range(2):
+                content = " ".join(
+                    f"q{query}d{document}p{passage}w{word}" for word in range(40)
+                )
+                yield content, f"s3://bucket/document{document}.pdf"
+
+    return passages
+
+
+class StubModelRuntime:
+    """Drafts and merges sections the way the prompts ask, and records the calls."""
+
+    def __init__(self):
+        self.excerpt_references = {}
+        self.merges = []
+
+    def converse(self, messages, **kwargs):
+        prompt = messages[0]["content"][0]["text"]
+        listed = {int(number): uri for number, uri in REFERENCE_LINE.findall(prompt)}
+
+        if prompt.startswith(REDUCE_MARKER):
+            cited = set()
+            points = []
+            # Only the drafts, not the bullet points of the prompt itself
+            for line in prompt[prompt.index("Draft 1:") :].splitlines():
+                if line.startswith("- ") and line not in points:
+                    points.append(line)
+                    cited.update(
+                        int(number) for number in re.findall(r"\[(\d+)\]", line)
+                    )
+            self.merges.append((cited, listed))
+        else:
+            self.excerpt_references.update(listed)
+            cited = set(listed)
+            points = [f"- Point from document {number} [{number}]" for number in cited]
+
+        text = "\n".join(
+            ["1. Section"]
+            + sorted(points)
+            + ["References:"]
+            + [f"{number}. {listed[number]}" for number in sorted(cited)]
+        )
+        return {"output": {"message": {"content": [{"text": text}]}}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=30)
+    parser.add_argument("--token-budget", type=int, default=600)
+    args = parser.parse_args()
+
+    runtime = StubModelRuntime()
+    processor = ICDeckProcessor(
+        kendra_client=StubRetriever(document_passages(args.documents)),
+        kendra_index_id="stub-index",
+        generation_backend=ModelGenerationBackend(runtime_client=runtime),
+        context_packer=ContextPacker(token_budget=args.token_budget),
+        map_reduce=True,
+    )
+    section = ICDeckSection(
+        name="Simulated Section",
+        kendra_queries=[f"query {index}" for index in range(3)],
+        flow_name="simulated_flow",
+        generation_prompt="Draft the section from: {{input}}",
+        page_size=2 * args.documents,
+    )
+
+    content = processor._generate_map_reduce(section, "client")
+    final_references = {
+        int(number): uri for number, uri in DRAFT_REFERENCE_LINE.findall(content)
+    }
+    excerpts = runtime.excerpt_references
+
+    # Every merge must see each number its drafts cite, with the original document
+    merge_inputs_complete = all(
+        all(listed.get(number) == excerpts[number] for number in cited)
+        for cited, listed in runtime.merges
+    )
+    references_kept = final_references == excerpts
+
+    print(f"Documents cited by the excerpts: {len(excerpts)}")
+    print(f"Merges with the reduce prompt: {len(runtime.merges)}")
+    print(f"Merge inputs list every cited reference: {merge_inputs_complete}")
+    print(f"Final section keeps every reference number: {references_kept}")
+    if not (runtime.merges and merge_inputs_complete and references_kept):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Measure the peak memory of building one section's LLM input.
+
+A stub retriever returns full pages of synthetic passages for every query, so
+no AWS access is needed. The peak traced by tracemalloc is reported for the
+streaming path (`build_section_input`) and for the materialized path
+(`_perform_kendra_search` followed by `format_for_llm`). The script exits with
+status 1 when a streaming peak exceeds --max-peak-kb, so it guards the memory
+budget in CI. The streaming peak is bounded by the pages waiting in the prefetch
+window and the pages in flight (one per retrieval worker); beyond those, only
+the signatures of the kept passages grow with --max-pages. The default limit is
+set for one retrieval worker; raise --max-peak-kb with --max-kendra-concurrency.
+
+Usage (from the repository root):
+    PYTHONPATH=. python scripts/measure_section_memory.py --page-size 100 \
+        --passage-chars 2000 --max-pages 3 --max-peak-kb 1536
+"""
+
+import argparse
+import itertools
+import sys
+import tracemalloc
+from src.pipeline.context_packer import ContextPacker
+from src.pipeline.kendra_flow import IC_DECK_SECTIONS, ICDeckProcessor
+from src.utils.query_yield import QueryYieldTracker
+from scripts.stubs import NoGeneration, StubRetriever
+
+
+def synthetic_passages(passage_chars: int):
+    """Return a passage source filling every page with distinct passages."""
+
+    def passages(query, page_number):
+        for index in itertools.count():
+            content = f"{query} page {page_number} item {index} " * 200
+            yield content[:passage_chars], f"s3://bucket/document{index % 7}.pdf"
+
+    return passages
+
+
+def measure(function) -> int:
+    """Run a function and return the peak traced memory in bytes."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--passage-chars", type=int, default=2000)
+    parser.add_argument("--max-pages", type=int, default=1)
+    parser.add_argument("--prefetch-pages", type=int, default=None)
+    parser.add_argument("--max-kendra-concurrency", type=int, default=1)
+    parser.add_argument("--token-budget", type=int, default=12000)
+    parser.add_argument("--max-peak-kb", type=int, default=1536)
+    args = parser.parse_args()
+
+    processor = ICDeckProcessor(
+        kendra_client=StubRetriever(synthetic_passages(args.passage_chars)),
+        kendra_index_id="stub-index",
+        generation_backend=NoGeneration(),
+        context_packer=ContextPacker(token_budget=args.token_budget),
+        query_yield=QueryYieldTracker(path="/tmp/measure_query_yield.json"),
+        max_kendra_concurrency=args.max_kendra_concurrency,
+        prefetch_pages=args.prefetch_pages,
+    )
+
+    exceeded = False
+    for name, section in IC_DECK_SECTIONS.items():
+        section.page_size = args.page_size
+        section.max_pages = args.max_pages
+
+        streaming = measure(lambda: processor.build_section_input(name, "client"))
+        materialized = measure(
+            lambda: processor.format_for_llm(
+                processor._perform_kendra_search(section, "client"),
+                section.kendra_queries,
+            )
+        )
+        print(
+            f"{name}: streaming peak {streaming / 1024:.0f} KB, "
+            f"materialized peak {materialized / 1024:.0f} KB"
+        )
+        if streaming > args.max_peak_kb * 1024:
+            exceeded = True
+
+    if exceeded:
+        print(f"Streaming peak exceeded {args.max_peak_kb} KB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
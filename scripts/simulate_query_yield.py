@@ -0,0 +1,115 @@
+"""
+Show that the adaptive query order follows changes in the documents.
+
+A stub retriever answers five queries from a corpus that changes halfway
+through the simulated runs: a query that used to repeat the others starts
+returning passages nobody else finds. Every run uses adaptive retrieval with a
+shared yield tracker, and the script prints the query order, the queries that
+were skipped and the recorded yields. It exits with status 1 if the order never
+changes or a skipped query is never measured again, so it can guard the
+ordering in CI.
+
+Usage (from the repository root):
+    PYTHONPATH=. python scripts/simulate_query_yield.py --runs 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from src.pipeline.kendra_flow import ICDeckProcessor, ICDeckSection
+from src.utils.query_yield import QueryYieldTracker
+from scripts.stubs import NoGeneration, StubRetriever
+
+QUERIES = ["alpha", "beta", "gamma", "delta", "epsilon"]
+
+# Passage ids each query returns, before and after the documents change
+CORPUS_BEFORE = {
+    "alpha": range(0, 10),
+    "beta": range(10, 20),
+    "gamma": list(range(0, 5)) + list(range(10, 15)),
+    "delta": range(10, 20),
+    "epsilon": range(30, 40),
+}
+CORPUS_AFTER = {
+    "alpha": range(0, 10),
+    "beta": range(10, 20),
+    "gamma": range(100, 110),
+    "delta": range(10, 20),
+    "epsilon": range(30, 40),
+}
+
+
+def corpus_passages(corpus):
+    """Return a passage source answering each query with its passages in a corpus."""
+
+    def passages(query, page_number):
+        for passage in corpus[query]:
+            content = f"passage {passage} " + " ".join(
+                f"term{passage}x{word}" for word in range(20)
+            )
+            yield content, f"s3://bucket/document{passage}.pdf"
+
+    return passages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=8)
+    args = parser.parse_args()
+
+    retriever = StubRetriever(corpus_passages(CORPUS_BEFORE))
+    yield_path = os.path.join(tempfile.mkdtemp(), "query_yield.json")
+    section = ICDeckSection(
+        name="Simulated Section",
+        kendra_queries=list(QUERIES),
+        flow_name="simulated_flow",
+        generation_prompt="{{input}}",
+    )
+
+    orders = []
+    remeasured = False
+    for run in range(1, args.runs + 1):
+        if run == args.runs // 2 + 1:
+            retriever.passages = corpus_passages(CORPUS_AFTER)
+            print("-- documents changed --")
+
+        # A fresh processor per run, as in separate deployments sharing the file
+        tracker = QueryYieldTracker(path=yield_path)
+        processor = ICDeckProcessor(
+            kendra_client=retriever,
+            kendra_index_id="stub-index",
+            generation_backend=NoGeneration(),
+            adaptive_retrieval=True,
+            query_yield=tracker,
+            max_kendra_concurrency=1,
+        )
+        order = tracker.order(section.name, list(QUERIES))
+        skipped_before = {
+            query: stats["skip_streak"]
+            for query, stats in tracker.stats().get(section.name, {}).items()
+        }
+        list(processor._stream_section_results(section, "client"))
+        tracker.save()
+
+        stats = tracker.stats()[section.name]
+        skipped = [query for query in QUERIES if stats[query]["skip_streak"]]
+        remeasured = remeasured or any(
+            streak and not stats[query]["skip_streak"]
+            for query, streak in skipped_before.items()
+        )
+        orders.append(order)
+        print(
+            f"run {run}: order {', '.join(order)}; skipped {', '.join(skipped) or '-'}; "
+            + ", ".join(f"{query} {stats[query]['yield']}" for query in QUERIES)
+        )
+
+    changed = any(order != orders[0] for order in orders[1:])
+    print(f"Order changed between runs: {changed}")
+    print(f"A skipped query was measured again: {remeasured}")
+    if not (changed and remeasured):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
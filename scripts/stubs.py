@@ -0,0 +1,44 @@
+"""
+Stand-ins for the Kendra client and the generation backend shared by the scripts.
+
+They let a script drive ICDeckProcessor without AWS access:
+
+    retriever = StubRetriever(lambda query, page: [("text", "s3://bucket/a.pdf")])
+    processor = ICDeckProcessor(
+        kendra_client=retriever,
+        kendra_index_id="stub-index",
+        generation_backend=NoGeneration(),
+    )
+"""
+
+from itertools import islice
+from typing import Callable, Iterable, Tuple
+from src.pipeline.generation_backend import GenerationBackend
+
+# Produces the (content, document URI) pairs of a query's results from a page number
+PassageSource = Callable[[str, int], Iterable[Tuple[str, str]]]
+
+
+class StubRetriever:
+    """Stands in for the Kendra client, answering each query from a passage source."""
+
+    def __init__(self, passages: PassageSource):
+        # Replace it to change the documents between runs
+        self.passages = passages
+
+    def retrieve(self, QueryText, PageSize=10, PageNumber=1, **kwargs):
+        return {
+            "ResultItems": [
+                {"Content": content, "DocumentURI": uri}
+                for content, uri in islice(
+                    self.passages(QueryText, PageNumber), PageSize
+                )
+            ]
+        }
+
+
+class NoGeneration(GenerationBackend):
+    """A backend that never deploys or invokes anything."""
+
+    def generate(self, section, input_data):
+        return ""
@@ -1,14 +1,79 @@
-import boto3  # Import the boto3 library for interacting with AWS services
 import uuid  # Import the uuid library for generating unique identifiers
 import os  # Import the os library for interacting with the operating system
 from dotenv import (
     load_dotenv,
 )  # Import the load_dotenv function for loading environment variables from a .env file
 import json  # Import the json library for working with JSON data
+import hashlib  # Import the hashlib library for hashing flow definitions
+import time  # Import the time library for backoff waits and timings
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)  # Import the thread pool used to provision flows concurrently
+from dataclasses import (
+    dataclass,
+)  # Import the dataclass decorator for the flow stream events
+from typing import Any, Dict, Iterator, List, Optional, Union
+from src.utils.aws_clients import (
+    get_client,
+)  # Import the shared boto3 client registry
+from src.utils.flow_cache import (
+    FlowOutputCache,
+)  # Import the disk cache for generated flow outputs
+from src.utils.local_state import (
+    env_flag,
+)  # Import the parser of boolean settings
 
 # Load environment variables from a .env file
 load_dotenv()
 
+# Model used by the prompt node of every analysis flow
+MODEL_ID = "anthropic.claude-instant-v1"
+
+# Inference settings used by the prompt node of every analysis flow
+INFERENCE_CONFIG = {"maxTokens": 2000, "temperature": 0.5, "topP": 0.9}
+
+# Longest time to wait for a flow to finish preparing
+FLOW_PREPARE_TIMEOUT_SECONDS = float(
+    os.environ.get("FLOW_PREPARE_TIMEOUT_SECONDS", "300")
+)
+
+
+@dataclass
+class FlowOutput:
+    """Content written to an output node of the flow"""
+
+    node_name: str
+    content: Any
+    elapsed: float
+
+
+@dataclass
+class FlowTrace:
+    """Trace of a flow node, only emitted when tracing is enabled"""
+
+    trace: Dict[str, Any]
+    elapsed: float
+
+
+@dataclass
+class FlowCompletion:
+    """End of a successful flow invocation"""
+
+    reason: str
+    elapsed: float
+
+
+@dataclass
+class FlowError:
+    """Failure of the invocation or of the response stream"""
+
+    message: str
+    elapsed: float
+
+
+# Any event yielded by BedrockFlow.stream_flow
+FlowEvent = Union[FlowOutput, FlowTrace, FlowCompletion, FlowError]
+
 
 class BedrockFlow:
     """
@@ -16,18 +81,153 @@ class BedrockFlow:
     Handles flow creation, execution, and management.
     """
 
-    def __init__(self, region_name="us-east-1"):
-        """Initialize BedrockFlow with AWS region"""
+    def __init__(
+        self,
+        region_name="us-east-1",
+        output_cache: Optional[FlowOutputCache] = None,
+        bypass_cache: Optional[bool] = None,
+        runtime_client: Any = None,
+    ):
+        """
+        Initialize BedrockFlow with AWS region and an optional output cache.
+        `runtime_client` replaces the shared bedrock-agent-runtime client, e.g. with a stub.
+        """
         self.region_name = region_name
+        self.runtime_client = runtime_client
+        self.model_id = MODEL_ID
+        self.inference_config = INFERENCE_CONFIG
+        self.output_cache = output_cache
+        # Force regeneration even when a cached output exists
+        if bypass_cache is None:
+            bypass_cache = env_flag("BYPASS_LLM_CACHE")
+        self.bypass_cache = bypass_cache
 
-    def call_flow(self, flow_id: str, flow_alias_id: str, input_data: str):
-        """Provide input to the current flow and get the output in a meaningful way"""
-        try:
-            # Create a client for the Bedrock agent runtime
-            bedrock = boto3.client(
-                "bedrock-agent-runtime", region_name=self.region_name
+    def call_flow(
+        self,
+        flow_id: str,
+        flow_alias_id: str,
+        input_data: str,
+        definition_hash: str = "",
+        bypass_cache: bool = False,
+    ):
+        """
+        Provide input to the current flow and get the output in a meaningful way.
+
+        When an output cache is configured, the output is looked up by a hash of
+        the flow ID, alias ID, definition hash and exact input data, and fresh
+        outputs are stored for the next run. The alias keeps its ID when it is
+        pointed at a new version, so the definition hash (prompt, model ID and
+        inference configuration) is what tells deployments apart. Passing
+        `bypass_cache` (or setting BYPASS_LLM_CACHE) skips the lookup but still
+        refreshes the cache.
+
+        Raises:
+            RuntimeError: If the invocation failed or the flow produced no output.
+        """
+        cache_key = None
+        if self.output_cache is not None:
+            cache_key = self.output_cache.make_key(
+                flow_id, flow_alias_id, definition_hash, input_data
+            )
+            if not (bypass_cache or self.bypass_cache):
+                cached_content = self.output_cache.get(cache_key)
+                if cached_content is not None:
+                    return cached_content
+
+        # Keep the content of the last output node
+        outputs = self._collect_outputs(flow_id, flow_alias_id, input_data)
+        if not outputs:
+            raise RuntimeError(f"Flow {flow_id} returned no output")
+        content = list(outputs.values())[-1]
+
+        # Store the fresh output for the next run
+        if cache_key is not None:
+            self.output_cache.put(cache_key, content)
+
+        return content
+
+    def call_flow_outputs(
+        self,
+        flow_id: str,
+        flow_alias_id: str,
+        input_data: Any,
+        definition_hash: str = "",
+        bypass_cache: bool = False,
+    ) -> Dict[str, str]:
+        """
+        Provide input to a flow with several output nodes and collect every output.
+
+        Args:
+            flow_id (str): The ID of the flow.
+            flow_alias_id (str): The ID of the flow alias.
+            input_data (Any): The document passed to the flow input node, e.g. an
+                object with one entry per prompt node.
+            definition_hash (str): Hash of the deployed flow definition, part of the
+                cache key.
+            bypass_cache (bool): Skip the cache lookup but refresh the cache.
+
+        Returns:
+            Dict[str, str]: The content of each flowOutputEvent, keyed by output node name.
+
+        Raises:
+            RuntimeError: If the invocation failed.
+        """
+        cache_key = None
+        if self.output_cache is not None:
+            cache_key = self.output_cache.make_key(
+                flow_id,
+                flow_alias_id,
+                definition_hash,
+                json.dumps(input_data, sort_keys=True),
             )
+            if not (bypass_cache or self.bypass_cache):
+                cached_content = self.output_cache.get(cache_key)
+                if cached_content is not None:
+                    return json.loads(cached_content)
+
+        outputs = self._collect_outputs(flow_id, flow_alias_id, input_data)
+
+        # Store the fresh outputs for the next run
+        if cache_key is not None:
+            self.output_cache.put(cache_key, json.dumps(outputs))
+
+        return outputs
+
+    def stream_flow(
+        self,
+        flow_id: str,
+        flow_alias_id: str,
+        input_data: Any,
+        enable_trace: bool = False,
+    ) -> Iterator[FlowEvent]:
+        """
+        Invoke a flow and yield its events as they arrive on the response stream.
+
+        Every event carries the seconds elapsed since the invocation started, so
+        the time to the first output can be measured by the consumer. The stream
+        ends with a FlowCompletion, or with a FlowError if the invocation or the
+        stream failed; errors are yielded rather than raised.
+
+        Args:
+            flow_id (str): The ID of the flow.
+            flow_alias_id (str): The ID of the flow alias.
+            input_data (Any): The document passed to the flow input node.
+            enable_trace (bool): Ask Bedrock for trace events of the flow nodes.
+
+        Yields:
+            FlowEvent: FlowOutput, FlowTrace, FlowCompletion or FlowError events.
+        """
+        start_time = time.perf_counter()
+
+        def elapsed() -> float:
+            return time.perf_counter() - start_time
+
+        # Get the shared client for the Bedrock agent runtime
+        bedrock = self.runtime_client or get_client(
+            "bedrock-agent-runtime", region_name=self.region_name
+        )
 
+        try:
             # Invoke the flow with the provided input data
             response = bedrock.invoke_flow(
                 flowAliasIdentifier=flow_alias_id,
@@ -39,77 +239,102 @@ class BedrockFlow:
                         "nodeOutputName": "document",
                     }
                 ],
+                enableTrace=enable_trace,
             )
-            try:
-                # Process the response stream to extract the content
-                for events in response.get("responseStream", []):
-                    if events.get("flowOutputEvent"):
-                        content = (
-                            events.get("flowOutputEvent").get("content").get("document")
+        except Exception as e:
+            yield FlowError(
+                message=f"Error invoking the flow: {str(e)}", elapsed=elapsed()
+            )
+            return
+
+        try:
+            # Translate each stream event as soon as it is received
+            for events in response.get("responseStream", []):
+                if events.get("flowOutputEvent"):
+                    output_event = events["flowOutputEvent"]
+                    yield FlowOutput(
+                        node_name=output_event.get("nodeName", ""),
+                        content=output_event.get("content", {}).get("document"),
+                        elapsed=elapsed(),
+                    )
+                elif events.get("flowTraceEvent"):
+                    yield FlowTrace(
+                        trace=events["flowTraceEvent"].get("trace", {}),
+                        elapsed=elapsed(),
+                    )
+                elif events.get("flowCompletionEvent"):
+                    yield FlowCompletion(
+                        reason=events["flowCompletionEvent"].get(
+                            "completionReason", ""
+                        ),
+                        elapsed=elapsed(),
+                    )
+                else:
+                    # Any other event is one of the stream's exception events
+                    for name, error in events.items():
+                        yield FlowError(
+                            message=f"{name}: {error.get('message', error)}",
+                            elapsed=elapsed(),
                         )
-            except Exception as e:
-                print(f"Error processing response stream: {str(e)}")
-                raise
+                        return
         except Exception as e:
-            print(f"Error invoking the flow: {str(e)}")
+            yield FlowError(
+                message=f"Error processing response stream: {str(e)}", elapsed=elapsed()
+            )
 
-        return content
+    def _collect_outputs(
+        self, flow_id: str, flow_alias_id: str, input_data: Any
+    ) -> Dict[str, str]:
+        """Drain stream_flow into the outputs keyed by node name, raising on errors"""
+        outputs = {}
+        for event in self.stream_flow(flow_id, flow_alias_id, input_data):
+            if isinstance(event, FlowOutput):
+                outputs[event.node_name] = event.content
+            elif isinstance(event, FlowError):
+                print(event.message)
+                raise RuntimeError(event.message)
+        return outputs
 
-    def create_analysis_flow(self, analysis_name: str, prompt: str, flow_name: str):
-        """Create a structured flow for analysis sections using Bedrock agents"""
-        # Create a client for the Bedrock agent
-        bedrock_client = boto3.client(
-            service_name="bedrock-agent", region_name=self.region_name
-        )
+    def build_combined_flow_definition(self, prompts: Dict[str, str]) -> dict:
+        """
+        Build one flow that runs several analysis prompts in parallel.
 
-        # Get the execution role ARN from environment variables
-        execution_role_arn = os.environ.get("FLOW_EXECUTION_ROLE_ARN")
-        if not execution_role_arn:
-            raise ValueError("FLOW_EXECUTION_ROLE_ARN environment variable is not set")
+        The input node takes an object with one entry per analysis. Each entry
+        feeds its own Prompt node, and each Prompt node writes to its own Output
+        node named "<analysis_name>_output".
 
-        # Define the flow structure
-        flow_definition = {
-            "nodes": [
+        Args:
+            prompts (Dict[str, str]): The prompt template of each analysis, keyed by
+                analysis name.
+
+        Returns:
+            dict: The flow definition.
+        """
+        nodes = [
+            {
+                "name": "document",
+                "type": "Input",
+                "outputs": [
+                    {"name": "document", "type": "Object"},
+                ],
+            }
+        ]
+        connections = []
+
+        for analysis_name, prompt in prompts.items():
+            # Reuse the prompt node of the single-section flow, fed by its own entry
+            prompt_node = self.build_flow_definition(analysis_name, prompt)["nodes"][1]
+            prompt_node["inputs"] = [
                 {
-                    "name": "document",
-                    "type": "Input",
-                    "outputs": [
-                        {"name": "document", "type": "String"},
-                    ],
-                },
+                    "name": "input",
+                    "type": "String",
+                    "expression": f"$.data.{analysis_name}",
+                }
+            ]
+            nodes.append(prompt_node)
+            nodes.append(
                 {
-                    "name": f"{analysis_name}",
-                    "type": "Prompt",
-                    "configuration": {
-                        "prompt": {
-                            "sourceConfiguration": {
-                                "inline": {
-                                    "inferenceConfiguration": {
-                                        "text": {
-                                            "maxTokens": 2000,
-                                            "temperature": 0.5,
-                                            "topP": 0.9,
-                                        }
-                                    },
-                                    "modelId": "anthropic.claude-instant-v1",
-                                    "templateConfiguration": {
-                                        "text": {
-                                            "inputVariables": [{"name": "input"}],
-                                            "text": prompt,
-                                        }
-                                    },
-                                    "templateType": "TEXT",
-                                }
-                            }
-                        }
-                    },
-                    "inputs": [
-                        {"name": "input", "type": "String", "expression": "$.data"}
-                    ],
-                    "outputs": [{"name": "modelCompletion", "type": "String"}],
-                },
-                {
-                    "name": "FinalOutput",
+                    "name": f"{analysis_name}_output",
                     "type": "Output",
                     "inputs": [
                         {
@@ -118,22 +343,24 @@ class BedrockFlow:
                             "expression": "$.data",
                         }
                     ],
-                },
-            ],
-            "connections": [
+                }
+            )
+            connections.append(
                 {
                     "name": f"InputTo{analysis_name}",
                     "source": "document",
-                    "target": f"{analysis_name}",
+                    "target": analysis_name,
                     "type": "Data",
                     "configuration": {
                         "data": {"sourceOutput": "document", "targetInput": "input"}
                     },
-                },
+                }
+            )
+            connections.append(
                 {
                     "name": f"{analysis_name}ToOutput",
-                    "source": f"{analysis_name}",
-                    "target": "FinalOutput",
+                    "source": analysis_name,
+                    "target": f"{analysis_name}_output",
                     "type": "Data",
                     "configuration": {
                         "data": {
@@ -141,57 +368,14 @@ class BedrockFlow:
                             "targetInput": "document",
                         }
                     },
-                },
-            ],
-        }
-
-        try:
-            # Create the flow
-            flow_response = bedrock_client.create_flow(
-                name=flow_name,
-                executionRoleArn=execution_role_arn,
-                description=f"Performs the {analysis_name} of a company",
-                definition=flow_definition,
-                clientToken=str(uuid.uuid4()),
+                }
             )
 
-            flow_id = flow_response.get("id")
-
-            # Prepare the flow
-            prepare_response = bedrock_client.prepare_flow(flowIdentifier=flow_id)
+        return {"nodes": nodes, "connections": connections}
 
-            # Create a new version of the flow
-            version_response = bedrock_client.create_flow_version(
-                flowIdentifier=flow_id, description="new version"
-            )
-
-            # Create an alias for the flow
-            alias_response = bedrock_client.create_flow_alias(
-                flowIdentifier=flow_id,
-                name="LATEST",
-                routingConfiguration=[{"flowVersion": version_response["version"]}],
-            )
-
-            return {"flowId": flow_id, "flowAliasId": alias_response.get("id")}
-
-        except Exception as e:
-            print(f"Unexpected error creating flow: {str(e)}")
-            raise
-
-    def change_flow(
-        self, flow_id: str, analysis_name: str, prompt: str, flow_name: str
-    ):
-        """Update flow based on new prompt"""
-        # Create a client for the Bedrock agent
-        bedrock_client = boto3.client(
-            service_name="bedrock-agent", region_name=self.region_name
-        )
-
-        # Get the execution role ARN from environment variables
-        execution_role_arn = os.environ.get("FLOW_EXECUTION_ROLE_ARN")
-        if not execution_role_arn:
-            raise ValueError("FLOW_EXECUTION_ROLE_ARN environment variable is not set")
-        flow_definition = {
+    def build_flow_definition(self, analysis_name: str, prompt: str) -> dict:
+        """Build the Input -> Prompt -> Output flow definition of an analysis section"""
+        return {
             "nodes": [
                 {
                     "name": "document",
@@ -208,13 +392,9 @@ class BedrockFlow:
                             "sourceConfiguration": {
                                 "inline": {
                                     "inferenceConfiguration": {
-                                        "text": {
-                                            "maxTokens": 2000,
-                                            "temperature": 0.5,
-                                            "topP": 0.9,
-                                        }
+                                        "text": dict(self.inference_config)
                                     },
-                                    "modelId": "anthropic.claude-instant-v1",
+                                    "modelId": self.model_id,
                                     "templateConfiguration": {
                                         "text": {
                                             "inputVariables": [{"name": "input"}],
@@ -268,6 +448,111 @@ class BedrockFlow:
             ],
         }
 
+    @staticmethod
+    def definition_hash(flow_definition: dict) -> str:
+        """Hash a flow definition, covering its prompt, model ID and inference configuration"""
+        canonical = json.dumps(flow_definition, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def deployed_definition_hashes(
+        self, flow_ids: Dict[str, str]
+    ) -> Dict[str, Optional[str]]:
+        """
+        Hash the definitions existing flows are deployed with, concurrently.
+
+        Args:
+            flow_ids (Dict[str, str]): The ID of every flow, keyed by flow name.
+
+        Returns:
+            Dict[str, Optional[str]]: The definition hash of every flow, or None
+            where its definition could not be read.
+        """
+
+        def fetch(flow_id: str) -> Optional[str]:
+            bedrock_client = get_client("bedrock-agent", region_name=self.region_name)
+            try:
+                response = bedrock_client.get_flow(flowIdentifier=flow_id)
+            except Exception as e:
+                print(f"Error getting definition of flow {flow_id}: {str(e)}")
+                return None
+            definition = response.get("definition")
+            return self.definition_hash(definition) if definition else None
+
+        if not flow_ids:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=len(flow_ids)) as executor:
+            hashes = executor.map(fetch, flow_ids.values())
+            return dict(zip(flow_ids, hashes))
+
+    def create_analysis_flow(
+        self,
+        analysis_name: str,
+        prompt: str,
+        flow_name: str,
+        flow_definition: Optional[dict] = None,
+    ):
+        """
+        Create a structured flow for analysis sections using Bedrock agents.
+        A prebuilt `flow_definition` (e.g. a combined flow) replaces the single-prompt one.
+        """
+        # Get the shared client for the Bedrock agent
+        bedrock_client = get_client("bedrock-agent", region_name=self.region_name)
+
+        # Get the execution role ARN from environment variables
+        execution_role_arn = os.environ.get("FLOW_EXECUTION_ROLE_ARN")
+        if not execution_role_arn:
+            raise ValueError("FLOW_EXECUTION_ROLE_ARN environment variable is not set")
+
+        # Define the flow structure
+        if flow_definition is None:
+            flow_definition = self.build_flow_definition(analysis_name, prompt)
+
+        try:
+            # Create the flow
+            flow_response = bedrock_client.create_flow(
+                name=flow_name,
+                executionRoleArn=execution_role_arn,
+                description=f"Performs the {analysis_name} of a company",
+                definition=flow_definition,
+                clientToken=str(uuid.uuid4()),
+            )
+
+            flow_id = flow_response.get("id")
+
+            # Prepare the flow and wait until it is ready to be versioned
+            bedrock_client.prepare_flow(flowIdentifier=flow_id)
+            self.wait_for_flow_prepared(flow_id)
+
+            # Create a new version of the flow and an alias pointing to it
+            flow_alias_id = self.publish_flow_version(flow_id)
+
+            return {"flowId": flow_id, "flowAliasId": flow_alias_id}
+
+        except Exception as e:
+            print(f"Unexpected error creating flow: {str(e)}")
+            raise
+
+    def change_flow(
+        self,
+        flow_id: str,
+        analysis_name: str,
+        prompt: str,
+        flow_name: str,
+        flow_alias_id: Optional[str] = None,
+        flow_definition: Optional[dict] = None,
+    ):
+        """Update flow based on new prompt and point its alias to the new version"""
+        # Get the shared client for the Bedrock agent
+        bedrock_client = get_client("bedrock-agent", region_name=self.region_name)
+
+        # Get the execution role ARN from environment variables
+        execution_role_arn = os.environ.get("FLOW_EXECUTION_ROLE_ARN")
+        if not execution_role_arn:
+            raise ValueError("FLOW_EXECUTION_ROLE_ARN environment variable is not set")
+        if flow_definition is None:
+            flow_definition = self.build_flow_definition(analysis_name, prompt)
+
         try:
             bedrock_client.update_flow(
                 flowIdentifier=flow_id,
@@ -277,35 +562,182 @@ class BedrockFlow:
             )
             print(f"Flow '{flow_name}' updated successfully.")
 
-            # Prepare the flow
-            prepare_response = bedrock_client.prepare_flow(flowIdentifier=flow_id)
+            # Prepare the flow and wait until it is ready to be versioned
+            bedrock_client.prepare_flow(flowIdentifier=flow_id)
+            self.wait_for_flow_prepared(flow_id)
 
             print(f"Flow '{flow_name}' prepared successfully.")
 
+            # Publish the update so invocations through the alias use it
+            flow_alias_id = self.publish_flow_version(flow_id, flow_alias_id)
+
+            return {"flowId": flow_id, "flowAliasId": flow_alias_id}
+
         except Exception as e:
             print(f"Error updating flow '{flow_name}': {e}")
+            raise
+
+    def wait_for_flow_prepared(
+        self,
+        flow_id: str,
+        timeout_seconds: float = FLOW_PREPARE_TIMEOUT_SECONDS,
+        initial_delay: float = 1.0,
+        max_delay: float = 16.0,
+    ) -> None:
+        """
+        Poll the flow status with exponential backoff until it is prepared.
+
+        Args:
+            flow_id (str): The ID of the flow being prepared.
+            timeout_seconds (float): Longest time to wait.
+            initial_delay (float): First wait between polls, doubled after every poll.
+            max_delay (float): Upper bound of the wait between polls.
+
+        Raises:
+            RuntimeError: If preparing the flow failed.
+            TimeoutError: If the flow is not prepared within `timeout_seconds`.
+        """
+        bedrock_client = get_client("bedrock-agent", region_name=self.region_name)
+        deadline = time.monotonic() + timeout_seconds
+        delay = initial_delay
+
+        while True:
+            response = bedrock_client.get_flow(flowIdentifier=flow_id)
+            status = response.get("status")
+
+            if status == "Prepared":
+                return
+            if status == "Failed":
+                raise RuntimeError(
+                    f"Flow {flow_id} failed to prepare: {response.get('validations', [])}"
+                )
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(
+                    f"Flow {flow_id} was not prepared within {timeout_seconds} seconds"
+                )
+
+            # Back off before polling again
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+    def publish_flow_version(
+        self,
+        flow_id: str,
+        flow_alias_id: Optional[str] = None,
+        flow_alias_name: str = "LATEST",
+    ) -> str:
+        """
+        Create a version of a prepared flow and route its alias to that version.
+
+        Args:
+            flow_id (str): The ID of the prepared flow.
+            flow_alias_id (Optional[str]): The ID of the existing alias to update. A new
+                alias is created when it is None.
+            flow_alias_name (str): The name of the alias. Defaults to "LATEST".
+
+        Returns:
+            str: The ID of the alias.
+        """
+        bedrock_client = get_client("bedrock-agent", region_name=self.region_name)
+
+        # Create a new version of the flow
+        version_response = bedrock_client.create_flow_version(
+            flowIdentifier=flow_id, description="new version"
+        )
+        routing_configuration = [{"flowVersion": version_response["version"]}]
+
+        # Route the existing alias to the new version
+        if flow_alias_id is not None:
+            bedrock_client.update_flow_alias(
+                flowIdentifier=flow_id,
+                aliasIdentifier=flow_alias_id,
+                name=flow_alias_name,
+                routingConfiguration=routing_configuration,
+            )
+            return flow_alias_id
+
+        # Create an alias for the flow
+        alias_response = bedrock_client.create_flow_alias(
+            flowIdentifier=flow_id,
+            name=flow_alias_name,
+            routingConfiguration=routing_configuration,
+        )
+        return alias_response.get("id")
+
+    def provision_flows(
+        self, flow_specs: List[Dict[str, Any]], max_workers: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Create or update several analysis flows concurrently.
+
+        Args:
+            flow_specs (List[Dict[str, Any]]): One spec per flow with "analysis_name",
+                "prompt" and "flow_name", and optionally a prebuilt "flow_definition".
+                Specs of existing flows also carry their "flow_id" and, if they have
+                one, "flow_alias_id"; they are updated instead of created.
+            max_workers (Optional[int]): Flows provisioned at the same time. Defaults
+                to one worker per flow.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per flow name, either the "flowId" and
+            "flowAliasId" of the deployed flow or the "error" that stopped it, plus
+            the "seconds" it took.
+        """
+
+        def provision(flow_spec: Dict[str, Any]) -> Dict[str, Any]:
+            start_time = time.perf_counter()
+            try:
+                if flow_spec.get("flow_id") is None:
+                    result = self.create_analysis_flow(
+                        analysis_name=flow_spec["analysis_name"],
+                        prompt=flow_spec["prompt"],
+                        flow_name=flow_spec["flow_name"],
+                        flow_definition=flow_spec.get("flow_definition"),
+                    )
+                else:
+                    result = self.change_flow(
+                        flow_id=flow_spec["flow_id"],
+                        analysis_name=flow_spec["analysis_name"],
+                        prompt=flow_spec["prompt"],
+                        flow_name=flow_spec["flow_name"],
+                        flow_alias_id=flow_spec.get("flow_alias_id"),
+                        flow_definition=flow_spec.get("flow_definition"),
+                    )
+            except Exception as e:
+                result = {"error": str(e)}
+
+            result["seconds"] = round(time.perf_counter() - start_time, 2)
+            print(f"Provisioned flow '{flow_spec['flow_name']}': {result}")
+            return result
+
+        if not flow_specs:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(flow_specs)) as executor:
+            results = executor.map(provision, flow_specs)
+            return {
+                flow_spec["flow_name"]: result
+                for flow_spec, result in zip(flow_specs, results)
+            }
 
     def get_flow_identifiers(self, flow_name: str, flow_alias_name: str):
         """Get existing flow identifiers"""
         try:
-            # Create a client for the Bedrock agent
-            bedrock_client = boto3.client("bedrock-agent", region_name=self.region_name)
-            flows_response = bedrock_client.list_flows()
+            # Get the shared client for the Bedrock agent
+            bedrock_client = get_client("bedrock-agent", region_name=self.region_name)
 
-            # Find the flow ID by name
-            for flow in flows_response.get("flowSummaries", []):
-                if flow["name"] == flow_name:
-                    flow_id = flow["id"]
-                    break
+            # Find the flow ID by name, looking past the first page of flows
+            for page in bedrock_client.get_paginator("list_flows").paginate():
+                for flow in page.get("flowSummaries", []):
+                    if flow["name"] == flow_name:
+                        flow_id = flow["id"]
 
             # Find the flow alias ID by name
-            flows_alias_response = bedrock_client.list_flow_aliases(
-                flowIdentifier=flow_id
-            )
-            for alias in flows_alias_response.get("flowAliasSummaries", []):
-                if alias["name"] == flow_alias_name:
-                    flow_alias_id = alias["id"]
-                    break
+            paginator = bedrock_client.get_paginator("list_flow_aliases")
+            for page in paginator.paginate(flowIdentifier=flow_id):
+                for alias in page.get("flowAliasSummaries", []):
+                    if alias["name"] == flow_alias_name:
+                        flow_alias_id = alias["id"]
 
             return {"flowId": flow_id, "flowAliasId": flow_alias_id}
 
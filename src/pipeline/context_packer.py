@@ -0,0 +1,318 @@
+import heapq
+import math
+import os
+import re
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterable, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Words of at least three letters or digits, used to match passages to queries
+TERM_PATTERN = re.compile(r"[a-z0-9]{3,}")
+
+# Reference listed for passages whose search result has no document URI
+UNKNOWN_DOCUMENT_URI = "Unknown document"
+
+
+@dataclass
+class PackedContext:
+    """The LLM input built from a section's passages, and what it cost."""
+
+    text: str
+    included: int
+    dropped: int
+    tokens_used: int
+    dropped_tokens: int
+    references: List[str] = field(default_factory=list)
+
+
+@dataclass
+class PackedChunks:
+    """The chunks of budget-sized LLM input built from a section's passages."""
+
+    chunks: List[PackedContext]
+    # Documents in the order of their reference IDs, shared by all chunks
+    references: List[str]
+    dropped: int
+    dropped_tokens: int
+
+
+class ContextPacker:
+    """
+    Pack search results into a compact, token-budgeted LLM input.
+
+    Passages are ranked by how well they cover the section's queries, with a
+    penalty for every passage already taken from the same document so the
+    context draws on several sources. They are added in that order until the
+    token budget is spent. Each document gets a numbered reference ID that is
+    printed once in a reference list instead of repeating its URI per passage.
+
+    Passages are consumed one at a time from any iterable. Only the best ones
+    whose text fits a candidate byte budget (twice the token budget in
+    characters, leaving room for the diversity ordering) are buffered, so the
+    memory held per section does not grow with the number of search results.
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        chars_per_token: float = 4.0,
+        diversity_penalty: float = 0.5,
+    ):
+        """
+        Initialize the packer.
+
+        Args:
+            token_budget (Optional[int]): Maximum estimated tokens of the packed
+                context. Defaults to CONTEXT_TOKEN_BUDGET or 12000.
+            chars_per_token (float): Characters per token used to estimate token
+                counts. Defaults to 4.
+            diversity_penalty (float): Factor applied to a passage's score for every
+                passage already taken from the same document. Defaults to 0.5.
+        """
+        self.token_budget = (
+            token_budget
+            if token_budget is not None
+            else int(os.environ.get("CONTEXT_TOKEN_BUDGET", "12000"))
+        )
+        self.chars_per_token = chars_per_token
+        self.diversity_penalty = diversity_penalty
+        # Bytes of passage text buffered while streaming the candidates
+        self.candidate_byte_budget = int(2 * self.token_budget * chars_per_token)
+
+    def estimate_tokens(self, text: str) -> int:
+        """
+        Estimate the number of tokens of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The estimated token count.
+        """
+        return self._tokens_for_length(len(text))
+
+    def _tokens_for_length(self, length: int) -> int:
+        """Estimate the number of tokens of a text of the given length."""
+        return max(1, math.ceil(length / self.chars_per_token))
+
+    def score(self, results: List[Dict[str, Any]], queries: List[str]) -> List[float]:
+        """
+        Score the relevance of each passage to a section's queries.
+
+        A passage that already carries a "score" (e.g. from a reranker) keeps it.
+        Otherwise its score is the best fraction of any query's terms it contains.
+
+        Args:
+            results (List[Dict[str, Any]]): The passages with "content".
+            queries (List[str]): The section's queries.
+
+        Returns:
+            List[float]: One score per passage.
+        """
+        query_terms = self._query_terms(queries)
+        return [self._score_one(result, query_terms) for result in results]
+
+    @staticmethod
+    def _query_terms(queries: List[str]) -> List[set]:
+        """Return the term sets of the queries that have any terms."""
+        query_terms = [set(TERM_PATTERN.findall(query.lower())) for query in queries]
+        return [terms for terms in query_terms if terms]
+
+    @staticmethod
+    def _score_one(result: Dict[str, Any], query_terms: List[set]) -> float:
+        """Score one passage against the term sets of the queries."""
+        if result.get("score") is not None:
+            return float(result["score"])
+
+        passage_terms = set(TERM_PATTERN.findall((result["content"] or "").lower()))
+        return max(
+            (len(terms & passage_terms) / len(terms) for terms in query_terms),
+            default=0.0,
+        )
+
+    def pack(
+        self,
+        results: Iterable[Dict[str, Any]],
+        queries: Optional[List[str]] = None,
+        trailer: str = "",
+    ) -> PackedContext:
+        """
+        Select and format the passages that fit the token budget.
+
+        Args:
+            results (Iterable[Dict[str, Any]]): The passages with "content" and
+                "document_uri", e.g. a generator streaming them from retrieval.
+            queries (Optional[List[str]]): The section's queries used for ranking.
+            trailer (str): Text appended after the reference list, not counted
+                against the budget.
+
+        Returns:
+            PackedContext: The formatted context and how much of the input was dropped.
+        """
+        packed = self.pack_chunks(results, queries, trailer=trailer)
+        return replace(
+            packed.chunks[0],
+            dropped=packed.dropped,
+            dropped_tokens=packed.dropped_tokens,
+        )
+
+    def pack_chunks(
+        self,
+        results: Iterable[Dict[str, Any]],
+        queries: Optional[List[str]] = None,
+        max_chunks: int = 1,
+        trailer: str = "",
+    ) -> PackedChunks:
+        """
+        Select and format passages into one or more chunks of the token budget.
+
+        Passages are placed in ranking order, so the first chunk holds the most
+        relevant ones; a new chunk is started when the current one is full, up
+        to `max_chunks`. Reference IDs are numbered across all chunks, so the
+        same document has the same ID in every chunk, and each chunk lists the
+        documents it cites.
+
+        Args:
+            results (Iterable[Dict[str, Any]]): The passages with "content" and
+                "document_uri", e.g. a generator streaming them from retrieval.
+            queries (Optional[List[str]]): The section's queries used for ranking.
+            max_chunks (int): Maximum number of chunks. Defaults to 1.
+            trailer (str): Text appended to every chunk, not counted against the budget.
+
+        Returns:
+            PackedChunks: The chunks, the document of every reference ID and how much
+            of the input was dropped.
+        """
+        query_terms = self._query_terms(queries or [])
+        max_chunks = max(1, max_chunks)
+        dropped = dropped_tokens = 0
+
+        # Buffer the best passages within the candidate byte budget, evicting the
+        # lowest scored ones as better passages arrive
+        byte_budget = self.candidate_byte_budget * max_chunks
+        buffered: List = []
+        buffered_bytes = 0
+        for sequence, result in enumerate(results):
+            content = " ".join((result["content"] or "").split())
+            size = len(content.encode("utf-8"))
+            heapq.heappush(
+                buffered,
+                (
+                    self._score_one(result, query_terms),
+                    -sequence,
+                    content,
+                    # Passages without a URI share one reference instead of failing
+                    result.get("document_uri") or UNKNOWN_DOCUMENT_URI,
+                    size,
+                ),
+            )
+            buffered_bytes += size
+            while buffered_bytes > byte_budget and len(buffered) > 1:
+                _, _, evicted, _, evicted_size = heapq.heappop(buffered)
+                buffered_bytes -= evicted_size
+                dropped += 1
+                dropped_tokens += self.estimate_tokens(evicted)
+
+        # Queue the passages of each document by descending score, then retrieval order
+        passages_by_document: Dict[str, List] = {}
+        for score, negative_sequence, content, uri, _ in buffered:
+            passages_by_document.setdefault(uri, []).append(
+                (-score, -negative_sequence, content)
+            )
+        del buffered
+        for passages in passages_by_document.values():
+            passages.sort()
+
+        # Always take the best next passage of any document, discounted by how
+        # many passages of its document were taken already
+        candidates = [
+            (passages[0][0], passages[0][1], uri, 0)
+            for uri, passages in passages_by_document.items()
+        ]
+        heapq.heapify(candidates)
+
+        reference_ids: Dict[str, int] = {}
+        chunks = [self._new_chunk()]
+
+        while candidates:
+            _, _, uri, taken = heapq.heappop(candidates)
+            _, _, content = passages_by_document[uri][taken]
+
+            # Queue the document's next passage with the diversity penalty applied
+            if taken + 1 < len(passages_by_document[uri]):
+                next_score, next_sequence, _ = passages_by_document[uri][taken + 1]
+                heapq.heappush(
+                    candidates,
+                    (
+                        next_score * self.diversity_penalty ** (taken + 1),
+                        next_sequence,
+                        uri,
+                        taken + 1,
+                    ),
+                )
+
+            reference_id = reference_ids.get(uri, len(reference_ids) + 1)
+            prefix = f"[{reference_id}] "
+            passage_tokens = self._tokens_for_length(len(prefix) + len(content))
+            reference_tokens = self._tokens_for_length(len(prefix) + len(uri))
+
+            # Start a new chunk when the passage does not fit the current one
+            chunk = chunks[-1]
+            cost = passage_tokens + (0 if uri in chunk["uris"] else reference_tokens)
+            if chunk["tokens"] + cost > self.token_budget and len(chunks) < max_chunks:
+                chunk = self._new_chunk()
+                cost = passage_tokens + reference_tokens
+                if chunk["tokens"] + cost <= self.token_budget:
+                    chunks.append(chunk)
+
+            # Skip passages that no longer fit, smaller ones may still fit
+            if chunk["tokens"] + cost > self.token_budget:
+                dropped += 1
+                dropped_tokens += passage_tokens
+                continue
+
+            reference_ids.setdefault(uri, reference_id)
+            chunk["uris"].setdefault(uri, reference_id)
+            chunk["parts"].extend((prefix, content, "\n"))
+            chunk["tokens"] += cost
+            chunk["included"] += 1
+
+        # List the documents cited by each chunk once, then build the only copy of
+        # each chunk's text
+        packed_chunks = []
+        for chunk in chunks:
+            parts = chunk["parts"]
+            parts.append("\nReferences:")
+            for uri, reference_id in sorted(chunk["uris"].items(), key=lambda x: x[1]):
+                parts.extend(("\n[", str(reference_id), "] ", uri))
+            if trailer:
+                parts.extend(("\n\n", trailer))
+            packed_chunks.append(
+                PackedContext(
+                    text="".join(parts),
+                    included=chunk["included"],
+                    dropped=0,
+                    tokens_used=chunk["tokens"],
+                    dropped_tokens=0,
+                    references=list(chunk["uris"]),
+                )
+            )
+
+        return PackedChunks(
+            chunks=packed_chunks,
+            references=sorted(reference_ids, key=reference_ids.get),
+            dropped=dropped,
+            dropped_tokens=dropped_tokens,
+        )
+
+    def _new_chunk(self) -> Dict[str, Any]:
+        """Return the state of an empty chunk, charged for its reference list header."""
+        return {
+            "parts": [],
+            "uris": {},
+            "tokens": self.estimate_tokens("References:"),
+            "included": 0,
+        }
@@ -1,59 +1,249 @@
 import json
-import boto3  # Import the boto3 library for interacting with AWS services
 import asyncio  # Import the asyncio module for asynchronous programming
-from src.pipeline.kendra_flow import ICDeckProcessor
+import time  # Import the time module for measuring per-client durations
+from typing import Any, Dict, List
+from src.pipeline.bedrock_flow import BedrockFlow
+from src.pipeline.kendra_flow import IC_DECK_SECTIONS, ICDeckProcessor
 from src.pipeline.kendra_source import KendraDataSource
-from src.utils.pdf_formatter import save_to_pdf
+from src.pipeline.local_retriever import LocalRetriever
+from src.pipeline.render_stage import RenderStage
+from src.utils.aws_clients import get_client
+from src.utils.deck_formats import parse_output_formats, upload_deck
+from src.utils.pdf_formatter import IncrementalDeckBuilder
+from src.utils.flow_cache import FlowOutputCache
+from src.utils.local_state import env_flag
+from src.utils.retrieval_cache import RetrievalCache
 from dotenv import load_dotenv
 import os
 
 # Load environment variables
 load_dotenv()
 
+# Maximum number of clients whose decks are generated at the same time
+MAX_CLIENT_WORKERS = int(os.environ.get("MAX_CLIENT_WORKERS", "4"))
 
-async def main() -> None:
+# Retrieval engine: "kendra", or "local" for the offline index over local PDFs
+RETRIEVAL_BACKEND = os.environ.get("RETRIEVAL_BACKEND", "kendra")
+
+# Whether Kendra retrieve results are cached between runs
+RETRIEVAL_CACHE_ENABLED = env_flag("RETRIEVAL_CACHE_ENABLED", True)
+
+# How decks are rendered: "pool" renders finished decks in the process pool of the
+# render stage, "incremental" lays out each section as soon as it is generated
+RENDER_MODE = os.environ.get("RENDER_MODE", "pool").lower()
+
+# Comma-separated formats each deck is rendered and uploaded in: pdf, pptx
+DECK_OUTPUT_FORMATS = os.environ.get("DECK_OUTPUT_FORMATS", "pdf")
+
+# Whether generated section outputs are cached between runs
+LLM_CACHE_ENABLED = env_flag("LLM_CACHE_ENABLED")
+
+
+async def run_client(
+    processor: ICDeckProcessor,
+    client_id: str,
+    semaphore: asyncio.Semaphore,
+    render_stage: RenderStage,
+    formats: List[str],
+) -> Dict[str, Any]:
+    """
+    Generate the deck for one client while holding a worker slot, then render
+    and upload it.
+
+    The blocking generation runs in a worker thread so several clients can be
+    processed at once. The worker slot is released as soon as the sections are
+    generated, so the next client's Bedrock and Kendra calls overlap with this
+    client's rendering in the render stage. With RENDER_MODE=incremental the
+    PDF is instead laid out section by section during generation. Any
+    exception is captured in the returned summary so a failing client does not
+    stop the rest of the batch.
+
+    Args:
+        processor (ICDeckProcessor): The processor used to generate the sections.
+        client_id (str): The client to generate the deck for.
+        semaphore (asyncio.Semaphore): Limits the number of clients in generation.
+        render_stage (RenderStage): Renders the finished sections.
+        formats (List[str]): The formats to render and upload, e.g. ["pdf", "pptx"].
+
+    Returns:
+        Dict[str, Any]: The client id, status, duration in seconds and error (if any).
+    """
+    start_time = time.perf_counter()
+    try:
+        if RENDER_MODE == "incremental" and "pdf" in formats:
+            # Lay out each section while the slower ones are still generating
+            deck_builder = IncrementalDeckBuilder(list(IC_DECK_SECTIONS))
+            try:
+                async with semaphore:
+                    await asyncio.to_thread(
+                        processor.generate_deck, client_id, deck_builder.add_section
+                    )
+                files = {"pdf": await asyncio.to_thread(deck_builder.finalize)}
+            finally:
+                deck_builder.close()
+
+            # Other formats reuse the sections the builder already parsed
+            other_formats = [
+                output_format for output_format in formats if output_format != "pdf"
+            ]
+            if other_formats:
+                files.update(
+                    await render_stage.render_parsed(
+                        deck_builder.sections, other_formats
+                    )
+                )
+        else:
+            async with semaphore:
+                # Generate all sections, running independent ones concurrently
+                sections = await asyncio.to_thread(processor.generate_deck, client_id)
+
+            # Parse once and render every format off the event loop
+            files = await render_stage.render(sections, formats)
+
+        # Upload all formats in one batch; a deck that did not reach S3 is a failure
+        s3_keys = await asyncio.to_thread(upload_deck, files, client_id)
+        failed_uploads = [
+            output_format for output_format, s3_key in s3_keys.items() if s3_key is None
+        ]
+        if failed_uploads:
+            raise RuntimeError(f"Upload of {', '.join(failed_uploads)} deck failed")
+        status, error = "success", None
+    except Exception as e:
+        print(f"Error generating IC Deck for client '{client_id}': {str(e)}")
+        status, error = "failed", str(e)
+
+    return {
+        "client_id": client_id,
+        "status": status,
+        "duration_seconds": round(time.perf_counter() - start_time, 2),
+        "error": error,
+    }
+
+
+async def main(max_workers: int = MAX_CLIENT_WORKERS) -> List[Dict[str, Any]]:
     """
     Main function to generate an IC Deck based on prompts and save it to PDF,
     which is then saved to S3 bucket.
+
+    Decks are generated for up to `max_workers` clients concurrently.
+
+    Args:
+        max_workers (int): Maximum number of clients processed at the same time.
+
+    Returns:
+        List[Dict[str, Any]]: One result summary per client, see `run_client`.
+    """
+    # Validate the output formats before any work is done
+    formats = parse_output_formats(DECK_OUTPUT_FORMATS)
+
+    # Start the render workers before any client threads run, so no worker is
+    # started while other threads are inside boto3 calls
+    async with RenderStage() as render_stage:
+        return await generate_decks(render_stage, formats, max_workers)
+
+
+async def generate_decks(
+    render_stage: RenderStage, formats: List[str], max_workers: int
+) -> List[Dict[str, Any]]:
     """
-    # Initialize AWS clients
-    kendra_client = boto3.client("kendra", region_name="us-east-1")
+    Generate, render and upload the decks of every client.
+
+    Args:
+        render_stage (RenderStage): The started stage rendering the finished decks.
+        formats (List[str]): The output formats of every deck.
+        max_workers (int): Maximum number of clients processed at the same time.
 
-    # Kendra index ID
-    kendra_index_id = os.environ.get("KENDRA_INDEX_ID")
-    # Check if kendra_index_id is set
-    if kendra_index_id is None:
-        raise ValueError("Kendra index ID is not set in environment variables")
+    Returns:
+        List[Dict[str, Any]]: One result summary per client, see `run_client`.
+    """
+    retrieval_cache = RetrievalCache() if RETRIEVAL_CACHE_ENABLED else None
+
+    if RETRIEVAL_BACKEND == "local":
+        # Search the offline index instead of Kendra; it answers the same calls
+        kendra_client = LocalRetriever.load_or_build()
+        kendra_index_id = kendra_client.index_id
+        client_ids = kendra_client.get_client_ids()
+    else:
+        # Get the shared AWS clients
+        kendra_client = get_client("kendra", region_name="us-east-1")
+
+        # Kendra index ID
+        kendra_index_id = os.environ.get("KENDRA_INDEX_ID")
+        # Check if kendra_index_id is set
+        if kendra_index_id is None:
+            raise ValueError("Kendra index ID is not set in environment variables")
+
+        # Get data source ids
+        data_source = KendraDataSource(region_name="us-east-1")
+        data_source_ids = data_source.get_data_source_ids(kendra_index_id)
+        # Get client ids
+        client_ids = data_source.get_client_ids(kendra_index_id, data_source_ids)
+
+        # Drop cached retrieve results of clients whose documents were re-synced
+        if retrieval_cache is not None:
+            sync_times = data_source.get_client_sync_times(
+                kendra_index_id, data_source_ids
+            )
+            for client_id, synced_at in sync_times.items():
+                retrieval_cache.invalidate_client(
+                    kendra_index_id, client_id, before=synced_at
+                )
+
+    # Reuse generated sections whose flow and input have not changed
+    output_cache = FlowOutputCache() if LLM_CACHE_ENABLED else None
 
     # Create processor
     processor = ICDeckProcessor(
-        kendra_client=kendra_client, kendra_index_id=kendra_index_id
+        kendra_client=kendra_client,
+        kendra_index_id=kendra_index_id,
+        retrieval_cache=retrieval_cache,
+        bedrock_flow=BedrockFlow(output_cache=output_cache),
     )
-    # Get data source ids
-    data_source_ids = KendraDataSource().get_data_source_ids(kendra_index_id)
-    # Get client ids
-    client_ids = KendraDataSource().get_client_ids(kendra_index_id, data_source_ids)
-
-    # Generate IC Deck for each client
-    for client_id in client_ids:
-        # Generate executive summary
-        executive_summary = processor.generate_section(
-            "executive_summary", client_id=client_id
+
+    # Generate IC Deck for each client, bounded by the worker limit, and render
+    # finished decks in the render stage while other clients are generating
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    results = await asyncio.gather(
+        *(
+            run_client(processor, client_id, semaphore, render_stage, formats)
+            for client_id in client_ids
         )
+    )
 
-        # Generate company overview
-        company_overview = processor.generate_section(
-            "company_overview", client_id=client_id
+    # Print a per-client summary of the run
+    for result in results:
+        print(
+            f"Client '{result['client_id']}': {result['status']} "
+            f"in {result['duration_seconds']}s"
+            + (f" ({result['error']})" if result["error"] else "")
         )
 
-        # Generate financial overview
-        financial_overview = processor.generate_section(
-            "financial_overview", client_id=client_id
+    # Keep the query yields for ordering the queries of the next run
+    processor.query_yield.save()
+    for section_name, queries in processor.query_yield.stats().items():
+        print(
+            f"Query yield of {section_name}: "
+            + ", ".join(
+                f"'{query}' {stats['yield']} ({stats['skipped']} skipped)"
+                for query, stats in queries.items()
+            )
         )
 
-        # Save to PDF
+    # Report how deep each query was paged and how long it took
+    for client_id, queries in processor.retrieval_stats().items():
+        for query, stats in queries.items():
+            print(
+                f"Retrieval '{client_id}' '{query}': {stats['pages']} pages, "
+                f"{stats['results']} results in {stats['seconds']:.2f}s"
+            )
 
-        save_to_pdf(executive_summary, company_overview, financial_overview, client_id)
+    # Report how many Kendra calls the cache saved
+    if retrieval_cache is not None:
+        print(f"Retrieval cache: {retrieval_cache.stats()}")
+    if output_cache is not None:
+        print(f"LLM output cache: {output_cache.stats()}")
+
+    return list(results)
 
 
 def lambda_handler(event, context):
@@ -69,18 +259,31 @@ def lambda_handler(event, context):
 
     Returns:
         dict: A response object containing:
-            - statusCode (int): HTTP status code 200 for success
-            - body (str): JSON-formatted success message
+            - statusCode (int): HTTP status code 200 when every client succeeded,
+              207 when only some of them did and 500 when all of them failed
+            - body (str): JSON-formatted message and per-client results
 
     Note:
         The function assumes the existence of an async 'main()' function and json module.
     """
 
     # Run the main function asynchronously
-    asyncio.run(main())
+    results = asyncio.run(main())
+
+    # Pick the status code based on how many clients succeeded
+    failed = [result for result in results if result["status"] != "success"]
+    if not failed:
+        status_code, message = 200, "successfully generated IC Deck"
+    elif len(failed) < len(results):
+        status_code, message = 207, "generated IC Deck for some clients"
+    else:
+        status_code, message = 500, "failed to generate IC Deck"
 
-    # Return a success response with status code 200 and a message
-    return {"statusCode": 200, "body": json.dumps(f"successfully generated IC Deck")}
+    # Return a response with the status code, a message and the per-client results
+    return {
+        "statusCode": status_code,
+        "body": json.dumps({"message": message, "results": results}),
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,123 @@
+import json
+import os
+from typing import Dict, Optional
+from botocore.exceptions import ClientError
+from src.utils.aws_clients import get_client
+from src.utils.local_state import LOCAL_STATE_DIR, atomic_write
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Default location of the manifest when no S3 bucket is configured
+DEFAULT_MANIFEST_PATH = os.path.join(LOCAL_STATE_DIR, "flow_manifest.json")
+
+# Default S3 key of the manifest when a bucket is configured
+DEFAULT_MANIFEST_KEY = "flow_manifest.json"
+
+
+class FlowManifest:
+    """
+    A content-addressed record of the flow definitions that are deployed.
+
+    For every flow the manifest stores the flow ID and the hash of the full
+    definition it was last deployed with, so a flow is only updated and
+    prepared when its prompt, model or inference configuration changed.
+    The manifest is one JSON document, kept in S3 when FLOW_MANIFEST_BUCKET or
+    OUTPUT_BUCKET_NAME is set (so it persists across Lambda containers) and in
+    a local file otherwise. It is read once and written once per reconciliation.
+    """
+
+    def __init__(
+        self,
+        bucket_name: Optional[str] = None,
+        key: Optional[str] = None,
+        path: Optional[str] = None,
+    ):
+        """
+        Initialize the manifest and load its current content.
+
+        Args:
+            bucket_name (Optional[str]): S3 bucket holding the manifest. Defaults to
+                FLOW_MANIFEST_BUCKET, then OUTPUT_BUCKET_NAME; the local file is used
+                when none is set.
+            key (Optional[str]): S3 key of the manifest. Defaults to FLOW_MANIFEST_KEY
+                or flow_manifest.json.
+            path (Optional[str]): Local path of the manifest. Defaults to
+                FLOW_MANIFEST_PATH or /tmp/flow_manifest.json.
+        """
+        # The deploy scripts only pass OUTPUT_BUCKET_NAME to the Lambda, whose /tmp
+        # is empty on every cold start
+        self.bucket_name = (
+            bucket_name
+            or os.environ.get("FLOW_MANIFEST_BUCKET")
+            or os.environ.get("OUTPUT_BUCKET_NAME")
+        )
+        self.key = key or os.environ.get("FLOW_MANIFEST_KEY", DEFAULT_MANIFEST_KEY)
+        self.path = path or os.environ.get("FLOW_MANIFEST_PATH", DEFAULT_MANIFEST_PATH)
+        self._entries: Dict[str, Dict[str, str]] = self._load()
+
+    def get_hash(self, flow_name: str, flow_id: str) -> Optional[str]:
+        """
+        Get the definition hash a flow was last deployed with.
+
+        Args:
+            flow_name (str): The name of the flow.
+            flow_id (str): The ID of the flow; a hash recorded for another flow with
+                the same name (e.g. one that was deleted and recreated) is ignored.
+
+        Returns:
+            Optional[str]: The recorded hash, or None if the flow is not in the manifest.
+        """
+        entry = self._entries.get(flow_name)
+        if entry is None or entry.get("flowId") != flow_id:
+            return None
+        return entry.get("definitionHash")
+
+    def record(self, flow_name: str, flow_id: str, definition_hash: str) -> None:
+        """
+        Record the definition a flow is now deployed with. Call save() to persist it.
+
+        Args:
+            flow_name (str): The name of the flow.
+            flow_id (str): The ID of the flow.
+            definition_hash (str): The hash of the deployed flow definition.
+        """
+        self._entries[flow_name] = {
+            "flowId": flow_id,
+            "definitionHash": definition_hash,
+        }
+
+    def save(self) -> None:
+        """Persist the manifest to S3 or the local file."""
+        body = json.dumps(self._entries, indent=2, sort_keys=True)
+
+        if self.bucket_name:
+            get_client("s3").put_object(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                Body=body.encode("utf-8"),
+                ContentType="application/json",
+            )
+            return
+
+        atomic_write(self.path, body)
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        """Load the manifest, starting empty if it does not exist yet."""
+        if self.bucket_name:
+            try:
+                response = get_client("s3").get_object(
+                    Bucket=self.bucket_name, Key=self.key
+                )
+                return json.loads(response["Body"].read())
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                    return {}
+                raise
+
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from src.utils.aws_clients import get_client
+from src.utils.local_state import LOCAL_STATE_DIR, atomic_write_json
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Default location of the persisted registry
+DEFAULT_REGISTRY_PATH = os.path.join(LOCAL_STATE_DIR, "flow_registry.json")
+
+
+class FlowRegistry:
+    """
+    An index of Bedrock flow names to their flow and alias identifiers.
+
+    The index is built from one paginated `list_flows` listing and persisted
+    to a JSON file with a TTL, so a warm start resolves every section's flow
+    without calling the Bedrock agent API.
+    """
+
+    def __init__(
+        self,
+        region_name: str = "us-east-1",
+        path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        """
+        Initialize the registry and load the persisted index if it is still fresh.
+
+        Args:
+            region_name (str): AWS region name. Defaults to "us-east-1".
+            path (Optional[str]): Path of the JSON file. Defaults to FLOW_REGISTRY_PATH
+                or /tmp/flow_registry.json.
+            ttl_seconds (Optional[float]): How long the persisted index is trusted.
+                Defaults to FLOW_REGISTRY_TTL_SECONDS or one hour.
+        """
+        self.region_name = region_name
+        self.path = path or os.environ.get("FLOW_REGISTRY_PATH", DEFAULT_REGISTRY_PATH)
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.environ.get("FLOW_REGISTRY_TTL_SECONDS", "3600"))
+        )
+        self._flows: Dict[str, Dict[str, Optional[str]]] = {}
+        self._updated_at = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def lookup(
+        self, flow_names: List[str], flow_alias_name: str = "LATEST"
+    ) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Resolve the identifiers of several flows at once.
+
+        The persisted index is used when it knows every requested flow; otherwise
+        the index is rebuilt from the Bedrock agent API once for all of them.
+
+        Args:
+            flow_names (List[str]): The names of the flows to resolve.
+            flow_alias_name (str): The name of the alias to resolve. Defaults to "LATEST".
+
+        Returns:
+            Dict[str, Dict[str, Optional[str]]]: The "flowId" and "flowAliasId" of each
+            flow that exists, keyed by flow name. "flowAliasId" is None if the flow has
+            no alias with the given name.
+        """
+        with self._lock:
+            if any(name not in self._flows for name in flow_names):
+                self._refresh(flow_names, flow_alias_name)
+
+            return {
+                name: dict(self._flows[name])
+                for name in flow_names
+                if name in self._flows
+            }
+
+    def register(self, flow_name: str, flow_ids: Dict[str, Optional[str]]) -> None:
+        """
+        Record the identifiers of a flow, e.g. after it was created.
+
+        Args:
+            flow_name (str): The name of the flow.
+            flow_ids (Dict[str, Optional[str]]): The "flowId" and "flowAliasId" of the flow.
+        """
+        with self._lock:
+            self._flows[flow_name] = {
+                "flowId": flow_ids["flowId"],
+                "flowAliasId": flow_ids.get("flowAliasId"),
+            }
+            self._save()
+
+    def invalidate(self) -> None:
+        """Forget the index, e.g. after a flow was deleted outside of this pipeline."""
+        with self._lock:
+            self._flows = {}
+            self._updated_at = 0.0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _refresh(self, flow_names: List[str], flow_alias_name: str) -> None:
+        """Rebuild the index from one paginated flow listing. The lock must be held."""
+        bedrock_client = get_client("bedrock-agent", region_name=self.region_name)
+
+        # Index every flow in the account by name
+        flow_ids_by_name = {}
+        for page in bedrock_client.get_paginator("list_flows").paginate():
+            for flow in page.get("flowSummaries", []):
+                flow_ids_by_name[flow["name"]] = flow["id"]
+
+        # Resolve the aliases of the requested flows only
+        flows = {}
+        for flow_name in flow_names:
+            flow_id = flow_ids_by_name.get(flow_name)
+            if flow_id is None:
+                continue
+
+            flow_alias_id = None
+            paginator = bedrock_client.get_paginator("list_flow_aliases")
+            for page in paginator.paginate(flowIdentifier=flow_id):
+                for alias in page.get("flowAliasSummaries", []):
+                    if alias["name"] == flow_alias_name:
+                        flow_alias_id = alias["id"]
+
+            flows[flow_name] = {"flowId": flow_id, "flowAliasId": flow_alias_id}
+
+        self._flows = flows
+        self._updated_at = time.time()
+        self._save()
+
+    def _load(self) -> None:
+        """Load the persisted index if it exists, matches the region and is fresh."""
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        if data.get("region_name") != self.region_name:
+            return
+        if time.time() - data.get("updated_at", 0) > self.ttl_seconds:
+            return
+
+        self._flows = data.get("flows", {})
+        self._updated_at = data["updated_at"]
+
+    def _save(self) -> None:
+        """Persist the index. The lock must be held."""
+        atomic_write_json(
+            self.path,
+            {
+                "region_name": self.region_name,
+                "updated_at": self._updated_at,
+                "flows": self._flows,
+            },
+        )
@@ -0,0 +1,185 @@
+import os
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from src.pipeline.bedrock_flow import (
+    INFERENCE_CONFIG,
+    MODEL_ID,
+    BedrockFlow,
+)  # Import the flow wrapper and the inference settings shared by both backends
+from src.utils.aws_clients import get_client
+from src.utils.flow_cache import FlowOutputCache
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from src.pipeline.kendra_flow import ICDeckSection
+
+# Load environment variables
+load_dotenv()
+
+
+class GenerationBackend(ABC):
+    """
+    Interface of the engines that turn a section's prompt and input into content.
+
+    `ICDeckProcessor` only talks to this interface, so the engine can be chosen
+    per deployment and replaced by a stub when benchmarking offline.
+    """
+
+    # Whether the processor has to deploy Bedrock flows before generating
+    requires_flows = False
+
+    @abstractmethod
+    def generate(self, section: "ICDeckSection", input_data: str) -> str:
+        """
+        Generate the content of a section.
+
+        Args:
+            section (ICDeckSection): The section, with its prompt template and flow ids.
+            input_data (str): The value substituted for {{input}} in the prompt.
+
+        Returns:
+            str: The generated content.
+        """
+
+
+class FlowGenerationBackend(GenerationBackend):
+    """Generate sections by invoking each section's Bedrock flow."""
+
+    requires_flows = True
+
+    def __init__(self, bedrock_flow: Optional[BedrockFlow] = None):
+        """
+        Initialize the backend.
+
+        Args:
+            bedrock_flow (Optional[BedrockFlow]): The flow wrapper to invoke.
+        """
+        self.bedrock_flow = bedrock_flow or BedrockFlow()
+
+    def generate(self, section: "ICDeckSection", input_data: str) -> str:
+        if section.flow_id is None or section.flow_alias_id is None:
+            raise ValueError(
+                f"Flow ID or alias ID is not set for section {section.name}"
+            )
+
+        return self.bedrock_flow.call_flow(
+            flow_id=section.flow_id,
+            flow_alias_id=section.flow_alias_id,
+            input_data=input_data,
+            definition_hash=section.definition_hash or "",
+        )
+
+
+class ModelGenerationBackend(GenerationBackend):
+    """
+    Generate sections by calling the model runtime directly.
+
+    The prompt template is rendered locally and sent to the Bedrock Converse
+    API with the same model and inference settings the flows use, which skips
+    the flow orchestration and the create/prepare/version/alias lifecycle.
+    """
+
+    def __init__(
+        self,
+        runtime_client: Any = None,
+        region_name: str = "us-east-1",
+        model_id: str = MODEL_ID,
+        inference_config: Optional[Dict[str, Any]] = None,
+        output_cache: Optional[FlowOutputCache] = None,
+        bypass_cache: bool = False,
+    ):
+        """
+        Initialize the backend.
+
+        Args:
+            runtime_client (Any): A bedrock-runtime client, or a stub with a `converse`
+                method. Defaults to the shared client.
+            region_name (str): AWS region name. Defaults to "us-east-1".
+            model_id (str): The model to call. Defaults to the flows' model.
+            inference_config (Optional[Dict[str, Any]]): maxTokens, temperature and
+                topP. Defaults to the flows' settings.
+            output_cache (Optional[FlowOutputCache]): Optional cache of generated content.
+            bypass_cache (bool): Skip cache lookups but still refresh the cache.
+        """
+        self.runtime_client = runtime_client or get_client(
+            "bedrock-runtime", region_name=region_name
+        )
+        self.model_id = model_id
+        self.inference_config = inference_config or INFERENCE_CONFIG
+        self.output_cache = output_cache
+        self.bypass_cache = bypass_cache
+
+    @staticmethod
+    def render_prompt(template: str, input_data: str) -> str:
+        """
+        Substitute the input into a prompt template the way the flow prompt node does.
+
+        Args:
+            template (str): The prompt template containing {{input}}.
+            input_data (str): The value of the input variable.
+
+        Returns:
+            str: The rendered prompt.
+        """
+        return template.replace("{{input}}", input_data)
+
+    def generate(self, section: "ICDeckSection", input_data: str) -> str:
+        prompt = self.render_prompt(section.generation_prompt, input_data)
+
+        # Serve unchanged prompts from the cache when one is configured
+        cache_key = None
+        if self.output_cache is not None:
+            cache_key = self.output_cache.make_key(
+                self.model_id, str(sorted(self.inference_config.items())), prompt
+            )
+            if not self.bypass_cache:
+                cached_content = self.output_cache.get(cache_key)
+                if cached_content is not None:
+                    return cached_content
+
+        response = self.runtime_client.converse(
+            modelId=self.model_id,
+            messages=[{"role": "user", "content": [{"text": prompt}]}],
+            inferenceConfig=dict(self.inference_config),
+        )
+        content = "".join(
+            block.get("text", "") for block in response["output"]["message"]["content"]
+        )
+
+        if cache_key is not None:
+            self.output_cache.put(cache_key, content)
+
+        return content
+
+
+def create_generation_backend(
+    backend_name: Optional[str] = None,
+    bedrock_flow: Optional[BedrockFlow] = None,
+) -> GenerationBackend:
+    """
+    Create the generation backend selected for this deployment.
+
+    Args:
+        backend_name (Optional[str]): "flow" or "model". Defaults to GENERATION_BACKEND
+            or "flow".
+        bedrock_flow (Optional[BedrockFlow]): The flow wrapper; its region and output
+            cache are reused by the model backend.
+
+    Returns:
+        GenerationBackend: The backend.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    backend_name = backend_name or os.environ.get("GENERATION_BACKEND", "flow")
+    bedrock_flow = bedrock_flow or BedrockFlow()
+
+    if backend_name == "flow":
+        return FlowGenerationBackend(bedrock_flow)
+    if backend_name == "model":
+        return ModelGenerationBackend(
+            region_name=bedrock_flow.region_name,
+            output_cache=bedrock_flow.output_cache,
+            bypass_cache=bedrock_flow.bypass_cache,
+        )
+    raise ValueError(f"Unknown generation backend: {backend_name}")
@@ -1,13 +1,24 @@
 from dataclasses import (
     dataclass,
+    field,
+    replace,
 )  # Import the dataclass decorator for creating data classes
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)  # Import the thread pool used to run independent sections concurrently
 from typing import (
+    Callable,
+    Iterable,
+    Iterator,
     List,
     Dict,
     Optional,
+    Tuple,
     Any,
 )  # Import type hints for better code readability and type checking
-import json  # Import the json library for working with JSON data
 from src.pipeline.bedrock_flow import (
     BedrockFlow,
 )  # Import the BedrockFlow class from the bedrock module
@@ -15,10 +26,43 @@ from src.pipeline.prompts import (  # Import specific prompts from prompts modul
     EXECUTIVE_SUMMARY_PROMPT,
     COMPANY_OVERVIEW_PROMPT,
     FINANCIAL_OVERVIEW_PROMPT,
+    REDUCE_PROMPT,
 )
+from src.pipeline.context_packer import (
+    ContextPacker,
+)  # Import the packer fitting search results into the token budget
+from src.pipeline.near_duplicates import (
+    NearDuplicateFilter,
+    passage_key,
+)  # Import the filter removing overlapping and repeated passages
+from src.pipeline.reranker import (
+    PassageReranker,
+)  # Import the optional reranker ordering passages across queries
+from src.utils.query_yield import (
+    QueryYieldTracker,
+)  # Import the per-query statistics ordering adaptive retrieval
+from src.pipeline.generation_backend import (
+    GenerationBackend,
+    create_generation_backend,
+)  # Import the pluggable engines generating section content
+from src.pipeline.flow_manifest import (
+    FlowManifest,
+)  # Import the manifest of deployed flow definitions
+from src.pipeline.flow_registry import (
+    FlowRegistry,
+)  # Import the registry resolving flow names to their identifiers
+from src.utils.retrieval_cache import (
+    RetrievalCache,
+)  # Import the cache for Kendra retrieve results
+from src.utils.local_state import (
+    env_flag,
+)  # Import the parser of boolean settings
 from fpdf import FPDF  # Import the FPDF class for generating PDF documents
-import hashlib
+from collections import Counter
 import os
+import re
+import threading
+import time
 
 from dotenv import load_dotenv
 
@@ -34,6 +78,13 @@ class ICDeckSection:
     generation_prompt: str
     flow_id: Optional[str] = None
     flow_alias_id: Optional[str] = None
+    # Hash of the deployed flow definition (prompt, model and inference settings)
+    definition_hash: Optional[str] = None
+    # Names of the sections whose generated text this section consumes
+    depends_on: List[str] = field(default_factory=list)
+    # Passages per retrieve call and the number of pages fetched per query
+    page_size: int = 10
+    max_pages: int = 1
 
 
 # Define the IC deck sections
@@ -72,6 +123,7 @@ IC_DECK_SECTIONS = {
         ],
         flow_name="company_overview_analysis_flow",
         generation_prompt=COMPANY_OVERVIEW_PROMPT,
+        max_pages=2,
     ),
     "financial_overview": ICDeckSection(
         name="Financial Overview Analysis",
@@ -95,176 +147,751 @@ IC_DECK_SECTIONS = {
         ],
         flow_name="financial_overview_analysis_flow",
         generation_prompt=FINANCIAL_OVERVIEW_PROMPT,
+        # Figures are spread over many pages of the financial statements
+        max_pages=3,
     ),
 }
 
+# Sections the executive summary consumes when chaining is enabled
+EXECUTIVE_SUMMARY_DEPENDENCIES = ["company_overview", "financial_overview"]
+
+# Name of the flow generating every section in one invocation (combined mode)
+COMBINED_FLOW_NAME = "ic_deck_combined_analysis_flow"
+
 
 class ICDeckProcessor:
-    def __init__(self, kendra_client, kendra_index_id):
+    def __init__(
+        self,
+        kendra_client,
+        kendra_index_id,
+        chain_executive_summary: Optional[bool] = None,
+        max_kendra_concurrency: Optional[int] = None,
+        retrieval_cache: Optional[RetrievalCache] = None,
+        bedrock_flow: Optional[BedrockFlow] = None,
+        flow_registry: Optional[FlowRegistry] = None,
+        flow_manifest: Optional[FlowManifest] = None,
+        combined_flow: Optional[bool] = None,
+        generation_backend: Optional[GenerationBackend] = None,
+        context_packer: Optional[ContextPacker] = None,
+        near_duplicate_filter: Optional[NearDuplicateFilter] = None,
+        reranker: Optional[PassageReranker] = None,
+        adaptive_retrieval: Optional[bool] = None,
+        query_yield: Optional[QueryYieldTracker] = None,
+        map_reduce: Optional[bool] = None,
+        reduce_backend: Optional[GenerationBackend] = None,
+        prefetch_pages: Optional[int] = None,
+    ):
         self.kendra_index_id = kendra_index_id
         self.kendra_client = kendra_client
-        self.bedrock_flow = BedrockFlow()
-        self.is_local = os.environ.get("ENVIRONMENT") == "local"
-        self._initialize_flows()
+        self.bedrock_flow = bedrock_flow or BedrockFlow()
+        # Engine generating the sections, flow-based unless configured otherwise
+        self.generation_backend = generation_backend or create_generation_backend(
+            bedrock_flow=self.bedrock_flow
+        )
+        # Let the executive summary build on the finished overview sections
+        if chain_executive_summary is None:
+            chain_executive_summary = env_flag("CHAIN_EXECUTIVE_SUMMARY")
+        self.chain_executive_summary = chain_executive_summary
+        # Generate all sections with one invocation of a combined flow
+        if combined_flow is None:
+            combined_flow = env_flag("COMBINED_FLOW")
+        self.combined_flow = combined_flow
+        if self.combined_flow and not self.generation_backend.requires_flows:
+            raise ValueError("Combined flow mode requires the flow generation backend")
+        # Shared pool limiting the number of Kendra calls in flight across all sections
+        if max_kendra_concurrency is None:
+            max_kendra_concurrency = int(os.environ.get("KENDRA_MAX_CONCURRENCY", "8"))
+        self.max_kendra_concurrency = max(1, max_kendra_concurrency)
+        self.retrieval_pool = ThreadPoolExecutor(
+            max_workers=self.max_kendra_concurrency,
+            thread_name_prefix="kendra-retrieve",
+        )
+        # Fetched pages allowed to wait for the consumer; with the pages in flight
+        # it bounds the retrieved passages held in memory per section. Defaults
+        # to twice the pool size, so later queries keep the pool busy while the
+        # consumer waits on an earlier page
+        if prefetch_pages is None:
+            prefetch_pages = (
+                int(os.environ.get("RETRIEVAL_PREFETCH_PAGES", "0"))
+                or 2 * self.max_kendra_concurrency
+            )
+        self.prefetch_pages = max(1, prefetch_pages)
+        # Optional cache of Kendra results shared by all sections and clients
+        self.retrieval_cache = retrieval_cache
+        # Packer fitting the search results of a section into the token budget
+        self.context_packer = context_packer or ContextPacker()
+        # Filter dropping passages that overlap an earlier one
+        self.near_duplicate_filter = near_duplicate_filter or NearDuplicateFilter()
+        # Optional reranker keeping the passages most relevant to all section queries
+        if reranker is None and env_flag("RERANK_ENABLED"):
+            reranker = PassageReranker()
+        self.reranker = reranker
+        # Issue queries in waves, best historical yield first, and stop once a wave
+        # adds too few new passages
+        if adaptive_retrieval is None:
+            adaptive_retrieval = env_flag("ADAPTIVE_RETRIEVAL")
+        self.adaptive_retrieval = adaptive_retrieval
+        self.adaptive_wave_size = max(1, int(os.environ.get("ADAPTIVE_WAVE_SIZE", "2")))
+        self.adaptive_min_new_ratio = float(
+            os.environ.get("ADAPTIVE_MIN_NEW_RATIO", "0.25")
+        )
+        # Statistics of how many new passages each query contributes
+        self.query_yield = query_yield or QueryYieldTracker()
+        # Pages fetched and time spent per client and query, see retrieval_stats()
+        self._retrieval_stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._retrieval_stats_lock = threading.Lock()
+        # Generate sections whose passages exceed the context budget by map-reduce,
+        # with a shared pool bounding the model calls in flight
+        if map_reduce is None:
+            map_reduce = env_flag("MAP_REDUCE_ENABLED")
+        self.map_reduce = map_reduce
+        self.map_reduce_max_chunks = max(
+            1, int(os.environ.get("MAP_REDUCE_MAX_CHUNKS", "8"))
+        )
+        self.generation_pool = None
+        self.reduce_backend = reduce_backend
+        if self.map_reduce:
+            self.generation_pool = ThreadPoolExecutor(
+                max_workers=max(
+                    1, int(os.environ.get("MAP_REDUCE_MAX_CONCURRENCY", "4"))
+                ),
+                thread_name_prefix="section-generate",
+            )
+            # Engine merging the drafts with the reduce prompt. A section's flow is
+            # bound to its generation prompt, so the flow backend merges through
+            # the model backend; the others render the reduce prompt themselves
+            if self.reduce_backend is None:
+                self.reduce_backend = (
+                    create_generation_backend("model", bedrock_flow=self.bedrock_flow)
+                    if self.generation_backend.requires_flows
+                    else self.generation_backend
+                )
+        # Deploy the flows only when the backend invokes them
+        self.flow_ids = {}
+        self.deployed_hashes = {}
+        if self.generation_backend.requires_flows:
+            self.flow_registry = flow_registry or FlowRegistry(
+                region_name=self.bedrock_flow.region_name
+            )
+            self.flow_manifest = flow_manifest or FlowManifest()
+            self._initialize_flows()
 
     def _initialize_flows(self):
-        for section_name, section in IC_DECK_SECTIONS.items():
-            try:
-                # Try to get existing flow
-                flow_ids = self.bedrock_flow.get_flow_identifiers(
-                    section.flow_name, "LATEST"
+        """
+        Make sure every section has a deployed flow that matches its definition.
+
+        Missing flows are created. Existing flows are only updated and prepared
+        when the hash of their full definition (prompt, model ID and inference
+        configuration) differs from the one recorded in the deployment manifest.
+        Existing flows the manifest does not know yet (e.g. deployed before it
+        was kept) are hashed from the definition Bedrock returns for them, which
+        is recorded instead of redeploying them blindly.
+        All flows are reconciled in one batch: the flows that need work are
+        provisioned concurrently and the manifest is written once. In combined
+        mode a single flow covering every section is deployed instead.
+        """
+        # Describe the flows this processor needs
+        flow_targets = self._flow_targets()
+
+        # Resolve the existing flows with a single registry lookup
+        existing_flows = self.flow_registry.lookup(list(flow_targets), "LATEST")
+
+        # Adopt the deployed definitions of existing flows missing from the manifest
+        unrecorded = {
+            flow_name: flow_ids["flowId"]
+            for flow_name, flow_ids in existing_flows.items()
+            if flow_ids["flowAliasId"] is not None
+            and self.flow_manifest.get_hash(flow_name, flow_ids["flowId"]) is None
+        }
+        deployed = self.bedrock_flow.deployed_definition_hashes(unrecorded)
+        for flow_name, deployed_hash in deployed.items():
+            if deployed_hash is not None:
+                self.flow_manifest.record(
+                    flow_name, unrecorded[flow_name], deployed_hash
                 )
 
-                # Check and update flow if in local environment
-                if self.is_local:
-                    prompt_hash = self._compute_hash(section.generation_prompt)
-                    stored_hash = self._get_stored_hash(section.flow_name)
-
-                    if prompt_hash != stored_hash:
-                        self.bedrock_flow.change_flow(
-                            flow_id=flow_ids["flowId"],
-                            analysis_name=section_name,
-                            prompt=section.generation_prompt,
-                            flow_name=section.flow_name,
-                        )
-                    self._store_hash(section.flow_name, prompt_hash)
-
-            except Exception:
-                # Create new flow if not found
-                flow_ids = self.bedrock_flow.create_analysis_flow(
-                    analysis_name=section_name,
-                    prompt=section.generation_prompt,
-                    flow_name=section.flow_name,
+        # Collect the flows that are missing or out of date
+        definition_hashes = {}
+        flow_specs = []
+        for flow_name, flow_target in flow_targets.items():
+            definition_hashes[flow_name] = self.bedrock_flow.definition_hash(
+                flow_target["flow_definition"]
+            )
+            flow_ids = existing_flows.get(flow_name)
+
+            if (
+                flow_ids is None
+                or flow_ids["flowAliasId"] is None
+                or self.flow_manifest.get_hash(flow_name, flow_ids["flowId"])
+                != definition_hashes[flow_name]
+            ):
+                flow_specs.append(
+                    {
+                        **flow_target,
+                        "flow_name": flow_name,
+                        "flow_id": flow_ids["flowId"] if flow_ids else None,
+                        "flow_alias_id": flow_ids["flowAliasId"] if flow_ids else None,
+                    }
                 )
 
-                # Store initial hash if in local environment
-                if self.is_local:
-                    self._store_hash(
-                        section.flow_name, self._compute_hash(section.generation_prompt)
-                    )
+        # Create or update all of them concurrently
+        provisioned = self.bedrock_flow.provision_flows(flow_specs)
 
-            # Update section with flow ids
-            section.flow_id = flow_ids["flowId"]
-            section.flow_alias_id = flow_ids["flowAliasId"]
+        self.flow_ids = {}
+        for flow_name in flow_targets:
+            flow_ids = existing_flows.get(flow_name)
+            result = provisioned.get(flow_name)
+
+            if result is not None and "error" not in result:
+                # Record the newly deployed definition
+                flow_ids = {
+                    "flowId": result["flowId"],
+                    "flowAliasId": result["flowAliasId"],
+                }
+                self.flow_registry.register(flow_name, flow_ids)
+                self.flow_manifest.record(
+                    flow_name, flow_ids["flowId"], definition_hashes[flow_name]
+                )
+                self.deployed_hashes[flow_name] = definition_hashes[flow_name]
+            elif flow_ids is None or flow_ids["flowAliasId"] is None:
+                # Without a deployed flow the deck cannot be generated
+                raise RuntimeError(
+                    f"Could not provision flow {flow_name}: {result['error']}"
+                )
+            else:
+                # Keep serving the deployed flow; the update is retried next run
+                self.deployed_hashes[flow_name] = (
+                    self.flow_manifest.get_hash(flow_name, flow_ids["flowId"]) or ""
+                )
+
+            self.flow_ids[flow_name] = flow_ids
             print("flow_ids", flow_ids)
 
-    def _compute_hash(self, prompt: str) -> str:
+        # Update sections with flow ids
+        for section in IC_DECK_SECTIONS.values():
+            flow_ids = self.flow_ids.get(section.flow_name)
+            if flow_ids is not None:
+                section.flow_id = flow_ids["flowId"]
+                section.flow_alias_id = flow_ids["flowAliasId"]
+                section.definition_hash = self.deployed_hashes[section.flow_name]
+
+        # Persist the reconciled definitions in one write
+        self.flow_manifest.save()
+
+    def _flow_targets(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Describe the flows the processor deploys.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The "analysis_name", "prompt" and full
+            "flow_definition" of each flow, keyed by flow name. In combined mode
+            this is one flow covering every section; otherwise one flow per section.
+        """
+        if self.combined_flow:
+            prompts = {
+                section_name: section.generation_prompt
+                for section_name, section in IC_DECK_SECTIONS.items()
+            }
+            return {
+                COMBINED_FLOW_NAME: {
+                    "analysis_name": "ic_deck",
+                    "prompt": "",
+                    "flow_definition": self.bedrock_flow.build_combined_flow_definition(
+                        prompts
+                    ),
+                }
+            }
+
+        return {
+            section.flow_name: {
+                "analysis_name": section_name,
+                "prompt": section.generation_prompt,
+                "flow_definition": self.bedrock_flow.build_flow_definition(
+                    section_name, section.generation_prompt
+                ),
+            }
+            for section_name, section in IC_DECK_SECTIONS.items()
+        }
+
+    def format_for_llm(
+        self,
+        results: Iterable[Dict[str, Any]],
+        queries: Optional[List[str]] = None,
+        trailer: str = "",
+    ) -> str:
         """
-        Compute the SHA-256 hash of a given prompt string.
+        Format search results for LLM input.
 
         Args:
-            prompt (str): The prompt string to be hashed.
+            results (Iterable[Dict[str, Any]]): The deduplicated search results, as a
+                list or a stream.
+            queries (Optional[List[str]]): The queries the results were retrieved for,
+                used to rank the passages.
+            trailer (str): Text appended after the reference list.
 
         Returns:
-            str: The SHA-256 hash of the prompt as a hexadecimal string.
+            str: The passages that fit the token budget, each prefixed with the
+            numbered reference ID of its document, followed by the reference list
+            and the trailer.
+        """
+        packed = self.context_packer.pack(results, queries, trailer)
+
+        # Report the passages that did not fit the budget
+        if packed.dropped:
+            print(
+                f"Context budget of {self.context_packer.token_budget} tokens reached: "
+                f"kept {packed.included} passages ({packed.tokens_used} tokens), "
+                f"dropped {packed.dropped} ({packed.dropped_tokens} tokens)"
+            )
 
-        This method takes a prompt string, computes its SHA-256 hash, and returns
-        the hash as a hexadecimal string.
+        return packed.text
+
+    def generate_deck(
+        self,
+        client_id: str,
+        on_section: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict[str, str]:
         """
-        # Compute the SHA-256 hash of the prompt string
-        hash_object = hashlib.sha256(prompt.encode("utf-8"))
+        Generate every section of the IC deck for a client.
 
-        # Return the hash as a hexadecimal string
-        return hash_object.hexdigest()
+        Args:
+            client_id (str): The client to generate the deck for.
+            on_section (Optional[Callable[[str, str], None]]): Called with the name
+                and content of each section as soon as it is generated, e.g. to lay
+                out the deck progressively.
 
-    def _store_hash(self, flow_name: str, prompt_hash: str) -> None:
+        Returns:
+            Dict[str, str]: The generated content keyed by section name, in the
+            order of IC_DECK_SECTIONS.
+
+        Sections without dependencies on each other are generated concurrently,
+        so the latency of a deck is the critical path of the section graph
+        rather than the sum of all sections. In combined mode the whole deck is
+        generated by one flow invocation instead.
+        """
+        if self.combined_flow:
+            sections = self._generate_combined_deck(client_id)
+            # All sections arrive at once in combined mode
+            if on_section is not None:
+                for section_name, content in sections.items():
+                    on_section(section_name, content)
+            return sections
+        return self._run_section_graph(
+            self._build_section_graph(), client_id, on_section
+        )
+
+    def _generate_combined_deck(self, client_id: str) -> Dict[str, str]:
         """
-        Store the hash of the prompt in a file named after the flow.
+        Generate every section with a single invocation of the combined flow.
+
+        Section dependencies are not applied in this mode, since all prompts of
+        the combined flow run in parallel.
 
         Args:
-            flow_name (str): The name of the flow. Used to create a unique filename.
-            prompt_hash (str): The hash of the prompt to be stored.
+            client_id (str): The client to generate the deck for.
 
-        This method creates a file named '<flow_name>_hash.txt' and writes the
-        provided prompt hash to it. If the file already exists, its contents
-        will be overwritten.
+        Returns:
+            Dict[str, str]: The generated content keyed by section name.
         """
-        # Create a filename by appending '_hash.txt' to the flow name
-        hash_file = f"{flow_name}_hash.txt"
+        # Gather the input of every section concurrently
+        with ThreadPoolExecutor(max_workers=len(IC_DECK_SECTIONS)) as executor:
+            section_inputs = dict(
+                zip(
+                    IC_DECK_SECTIONS,
+                    executor.map(
+                        lambda section_name: self.build_section_input(
+                            section_name, client_id
+                        ),
+                        IC_DECK_SECTIONS,
+                    ),
+                )
+            )
+
+        # Generate all sections in one invocation
+        flow_ids = self.flow_ids[COMBINED_FLOW_NAME]
+        outputs = self.bedrock_flow.call_flow_outputs(
+            flow_id=flow_ids["flowId"],
+            flow_alias_id=flow_ids["flowAliasId"],
+            input_data={
+                section_name: section_input
+                for section_name, section_input in section_inputs.items()
+            },
+            definition_hash=self.deployed_hashes[COMBINED_FLOW_NAME],
+        )
 
-        # Open the file in write mode. If the file does not exist, it will be created.
-        with open(hash_file, "w") as file:
-            # Write the prompt hash to the file
-            file.write(prompt_hash)
+        # Map the output nodes back to their sections
+        missing = [name for name in IC_DECK_SECTIONS if f"{name}_output" not in outputs]
+        if missing:
+            raise ValueError(
+                f"Combined flow returned no output for {', '.join(missing)}"
+            )
+        return {name: outputs[f"{name}_output"] for name in IC_DECK_SECTIONS}
 
-    def _get_stored_hash(self, flow_name: str) -> str:
+    def _build_section_graph(self) -> Dict[str, List[str]]:
         """
-        Retrieve the stored hash of the prompt from a file named after the flow.
+        Build the dependency graph of the IC deck sections.
+
+        Returns:
+            Dict[str, List[str]]: The dependencies of each section, keyed by section name.
+        """
+        graph = {
+            section_name: list(section.depends_on)
+            for section_name, section in IC_DECK_SECTIONS.items()
+        }
+
+        # Optionally feed the overviews into the executive summary
+        if self.chain_executive_summary:
+            for dependency in EXECUTIVE_SUMMARY_DEPENDENCIES:
+                if dependency not in graph["executive_summary"]:
+                    graph["executive_summary"].append(dependency)
+
+        return graph
+
+    def _run_section_graph(
+        self,
+        graph: Dict[str, List[str]],
+        client_id: str,
+        on_section: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict[str, str]:
+        """
+        Generate the sections of a dependency graph, running ready sections concurrently.
 
         Args:
-            flow_name (str): The name of the flow. Used to create a unique filename.
+            graph (Dict[str, List[str]]): The dependencies of each section.
+            client_id (str): The client to generate the sections for.
+            on_section (Optional[Callable[[str, str], None]]): Called with the name
+                and content of each section as it finishes, in completion order.
 
         Returns:
-            str: The stored hash of the prompt. Returns an empty string if the file does not exist.
+            Dict[str, str]: The generated content keyed by section name.
 
-        This method reads the hash from a file named '<flow_name>_hash.txt'. If the file
-        exists, it reads and returns the hash. If the file does not exist, it returns an empty string.
+        Raises:
+            ValueError: If a dependency is unknown or the graph contains a cycle.
         """
-        # Create a filename by appending '_hash.txt' to the flow name
-        hash_file = f"{flow_name}_hash.txt"
+        # Validate the dependencies up front so no work is wasted on a bad graph
+        for section_name, dependencies in graph.items():
+            for dependency in dependencies:
+                if dependency not in graph:
+                    raise ValueError(
+                        f"Section {section_name} depends on unknown section {dependency}"
+                    )
 
-        # Check if the file exists
-        if os.path.exists(hash_file):
-            # Open the file in read mode
-            with open(hash_file, "r") as file:
-                # Read and return the hash, stripping any leading/trailing whitespace
-                return file.read().strip()
+        outputs: Dict[str, str] = {}
+        pending = dict(graph)
 
-        # Return an empty string if the file does not exist
-        return ""
+        with ThreadPoolExecutor(max_workers=max(1, len(graph))) as executor:
+            running = {}
+            while pending or running:
+                # Submit every section whose dependencies have all finished
+                for section_name, dependencies in list(pending.items()):
+                    if all(dependency in outputs for dependency in dependencies):
+                        del pending[section_name]
+                        dependency_outputs = {
+                            dependency: outputs[dependency]
+                            for dependency in dependencies
+                        }
+                        future = executor.submit(
+                            self.generate_section,
+                            section_name,
+                            client_id,
+                            dependency_outputs or None,
+                        )
+                        running[future] = section_name
 
-    def format_for_llm(self, results: List[Dict[str, Any]]) -> str:
-        """Format search results for LLM input."""
-        formatted_input = []
+                # Nothing can run but sections remain, so the graph has a cycle
+                if not running:
+                    raise ValueError(
+                        f"Circular section dependencies: {', '.join(pending)}"
+                    )
 
-        for idx, result in enumerate(results, 1):
-            entry = f"""
-                -------------------------------
-                Content: {result['content']}
-                Reference: {result['document_uri']}
-                -------------------------------"""
-            formatted_input.append(entry)
+                # Wait for the next section to finish and record its output
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    section_name = running.pop(future)
+                    outputs[section_name] = future.result()
+                    if on_section is not None:
+                        on_section(section_name, outputs[section_name])
 
-        return "\n".join(formatted_input)
+        # Return the outputs in the order of the graph
+        return {section_name: outputs[section_name] for section_name in graph}
 
-    def generate_section(self, section_name: str, client_id: str) -> str:
+    def generate_section(
+        self,
+        section_name: str,
+        client_id: str,
+        dependency_outputs: Optional[Dict[str, str]] = None,
+    ) -> str:
         """
         Generate a section of the IC deck.
 
         Args:
             section_name (str): The name of the section to generate.
+            client_id (str): The client to generate the section for.
+            dependency_outputs (Optional[Dict[str, str]]): Already generated sections
+                this section builds on, keyed by section name.
 
         Returns:
             str: The generated content for the section.
 
         This method generates a section of the IC deck by performing the following steps:
         1. Gather data from Kendra using the queries defined for the section.
-        2. Format the gathered data for input to the Bedrock Flow.
-        3. Generate content using the Bedrock Flow with the formatted input.
+        2. Format the gathered data for input to the generation backend.
+        3. Generate content with the backend (a Bedrock Flow or a direct model call).
         """
         # Retrieve the section configuration from IC_DECK_SECTIONS
         section = IC_DECK_SECTIONS[section_name]
 
-        # 1. Gather data from Kendra
-        search_results = self._perform_kendra_search(section, client_id)
+        # Summarize large data rooms chunk by chunk, then merge the summaries
+        if self.map_reduce:
+            return self._generate_map_reduce(section, client_id, dependency_outputs)
 
-        # Format the gathered data for LLM input
-        formatted_input = self.format_for_llm(search_results)
+        # 1. Gather data from Kendra and format it for the Bedrock Flow
+        formatted_input = self.build_section_input(
+            section_name, client_id, dependency_outputs
+        )
 
-        if section.flow_id is None or section.flow_alias_id is None:
-            raise ValueError(
-                f"Flow ID or alias ID is not set for section {section_name}"
+        # 2. Generate content using the configured backend
+        content = self.generation_backend.generate(section, formatted_input)
+
+        # Return the generated content
+        return content
+
+    def _generate_map_reduce(
+        self,
+        section: ICDeckSection,
+        client_id: str,
+        dependency_outputs: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Generate a section from more passages than fit one model context.
+
+        The passages are packed into up to `map_reduce_max_chunks` chunks of the
+        context budget, with reference IDs numbered across all chunks. The map
+        step generates a draft of the section from every chunk concurrently; the
+        reduce step merges groups of drafts that fit the budget, level by level,
+        until one draft is left. Merges use REDUCE_PROMPT, which keeps the
+        reference numbers of the drafts. Each level divides the number of drafts by the
+        group size, so latency grows with the logarithm of the data room size.
+
+        Args:
+            section (ICDeckSection): The section to generate.
+            client_id (str): The client to generate the section for.
+            dependency_outputs (Optional[Dict[str, str]]): Already generated sections
+                this section builds on, keyed by section name. They are only passed
+                to the reduce step.
+
+        Returns:
+            str: The generated content for the section.
+        """
+        packed = self.context_packer.pack_chunks(
+            self._stream_section_results(section, client_id),
+            section.kendra_queries,
+            max_chunks=self.map_reduce_max_chunks,
+        )
+        if packed.dropped:
+            print(
+                f"Map-reduce input of {section.name} limited to "
+                f"{self.map_reduce_max_chunks} chunks: dropped {packed.dropped} "
+                f"passages ({packed.dropped_tokens} tokens)"
             )
 
-        # 2. Generate content using Bedrock Flow
-        content = self.bedrock_flow.call_flow(
-            flow_id=section.flow_id,
-            flow_alias_id=section.flow_alias_id,
-            input_data=json.dumps(formatted_input),
+        trailer = self._dependency_trailer(dependency_outputs)
+
+        # Everything fits one context, generate the section in one pass
+        chunks = packed.chunks
+        if len(chunks) == 1:
+            text = chunks[0].text + ("\n\n" + trailer if trailer else "")
+            return self.generation_backend.generate(section, text)
+
+        # Map: draft the section from every chunk
+        drafts = self._generate_all(
+            self.generation_backend,
+            section,
+            [
+                f"Excerpt {index} of {len(chunks)} of the data room. Reference numbers "
+                f"are shared by all excerpts.\n\n{chunk.text}"
+                for index, chunk in enumerate(chunks, 1)
+            ],
         )
 
-        # Return the generated content
-        return content
+        # Reduce: merge groups of drafts until one is left
+        reserved_tokens = self.context_packer.estimate_tokens(trailer) + sum(
+            self.context_packer.estimate_tokens(f"[{index}] {uri}")
+            for index, uri in enumerate(packed.references, 1)
+        )
+        draft_budget = max(1, self.context_packer.token_budget - reserved_tokens)
+        reduce_section = replace(
+            section,
+            generation_prompt=REDUCE_PROMPT.replace("{{section}}", section.name),
+        )
+        while len(drafts) > 1:
+            groups = self._group_drafts(drafts, draft_budget)
+            merged = self._generate_all(
+                self.reduce_backend,
+                reduce_section,
+                [
+                    self._reduce_input(group, packed.references, trailer)
+                    for group in groups
+                    if len(group) > 1
+                ],
+            )
+
+            # Groups of a single draft move up a level unchanged
+            merged_drafts = iter(merged)
+            drafts = [
+                next(merged_drafts) if len(group) > 1 else group[0] for group in groups
+            ]
+
+        return drafts[0]
+
+    def _generate_all(
+        self, backend: GenerationBackend, section: ICDeckSection, inputs: List[str]
+    ) -> List[str]:
+        """
+        Generate a section from several inputs through the shared generation pool.
+
+        Args:
+            backend (GenerationBackend): The engine generating the content.
+            section (ICDeckSection): The section whose prompt is used.
+            inputs (List[str]): The inputs substituted for {{input}}.
+
+        Returns:
+            List[str]: The generated content of every input, in input order.
+        """
+        futures = [
+            self.generation_pool.submit(backend.generate, section, text)
+            for text in inputs
+        ]
+        return [future.result() for future in futures]
+
+    def _group_drafts(self, drafts: List[str], token_budget: int) -> List[List[str]]:
+        """
+        Group consecutive drafts so each group fits the token budget.
+
+        Every group but the last holds at least two drafts, so each reduce level
+        shrinks the number of drafts even if single drafts exceed the budget.
+
+        Args:
+            drafts (List[str]): The drafts to group.
+            token_budget (int): The token budget of a group.
+
+        Returns:
+            List[List[str]]: The groups, in draft order.
+        """
+        groups: List[List[str]] = [[]]
+        group_tokens = 0
+        for draft in drafts:
+            draft_tokens = self.context_packer.estimate_tokens(draft)
+            if len(groups[-1]) >= 2 and group_tokens + draft_tokens > token_budget:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(draft)
+            group_tokens += draft_tokens
+        return groups
+
+    @staticmethod
+    def _reduce_input(drafts: List[str], references: List[str], trailer: str) -> str:
+        """
+        Build the input merging several drafts of a section.
+
+        Args:
+            drafts (List[str]): The drafts to merge.
+            references (List[str]): The documents in the order of their reference IDs.
+            trailer (str): The generated sections the section depends on, if any.
+
+        Returns:
+            str: The drafts followed by the documents they cite, for REDUCE_PROMPT.
+        """
+        # List only the references the drafts cite, with their original numbers
+        cited = sorted(
+            {
+                int(number)
+                for draft in drafts
+                for number in re.findall(r"\[(\d+)\]", draft)
+                if 0 < int(number) <= len(references)
+            }
+        )
+        parts = []
+        for index, draft in enumerate(drafts, 1):
+            parts.append(f"\nDraft {index}:\n{draft}\n")
+        parts.append("\nReferences:")
+        for number in cited:
+            parts.append(f"\n[{number}] {references[number - 1]}")
+        if trailer:
+            parts.append(f"\n\n{trailer}")
+        return "".join(parts).lstrip()
+
+    def build_section_input(
+        self,
+        section_name: str,
+        client_id: str,
+        dependency_outputs: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Build the LLM input of a section from its Kendra search results.
+
+        Args:
+            section_name (str): The name of the section.
+            client_id (str): The client to search the documents of.
+            dependency_outputs (Optional[Dict[str, str]]): Already generated sections
+                this section builds on, keyed by section name.
+
+        Returns:
+            str: The formatted input of the section.
+        """
+        section = IC_DECK_SECTIONS[section_name]
+
+        # Pack the stream into the only materialized copy of the LLM input
+        return self.format_for_llm(
+            self._stream_section_results(section, client_id),
+            section.kendra_queries,
+            self._dependency_trailer(dependency_outputs),
+        )
+
+    def _stream_section_results(
+        self, section: ICDeckSection, client_id: str
+    ) -> Iterable[Dict[str, Any]]:
+        """
+        Stream the passages of a section from Kendra through the duplicate filters.
+
+        Args:
+            section (ICDeckSection): The section to retrieve the passages of.
+            client_id (str): The client to search the documents of.
+
+        Returns:
+            Iterable[Dict[str, Any]]: The unique passages, reranked when enabled.
+        """
+        search_results = self.near_duplicate_filter.stream(
+            self._iter_kendra_pages(section, client_id)
+        )
+
+        # Keep the passages most relevant to the section when reranking is enabled.
+        # Its term weights depend on the whole candidate set, so this materializes it
+        if self.reranker is not None:
+            search_results = self.reranker.rerank(
+                list(search_results), section.kendra_queries
+            )
+
+        return search_results
+
+    @staticmethod
+    def _dependency_trailer(dependency_outputs: Optional[Dict[str, str]]) -> str:
+        """
+        Format the generated sections a section depends on.
+
+        Args:
+            dependency_outputs (Optional[Dict[str, str]]): Already generated sections,
+                keyed by section name.
+
+        Returns:
+            str: The text placed after the references, empty without dependencies.
+        """
+        if not dependency_outputs:
+            return ""
+        return "Previously generated sections:\n" + "\n".join(
+            f"{IC_DECK_SECTIONS[name].name}:\n{content}"
+            for name, content in dependency_outputs.items()
+        )
 
     def _perform_kendra_search(
         self, section: ICDeckSection, client_id: str
@@ -272,60 +899,312 @@ class ICDeckProcessor:
         """
         Perform Kendra searches for the section.
 
-        This method performs a Kendra search for each query in the section
-        and returns a list of dictionaries containing the result items.
+        Returns the pages of `_iter_kendra_pages` as one list, with the
+        passages that are near duplicates of an earlier one (overlapping
+        excerpts, boilerplate shared by several documents) removed.
 
         The dictionaries contain the following keys:
             - content: The actual content returned by the Kendra search.
             - document_uri: The URL of the document that the content is from.
+        """
+        return list(
+            self.near_duplicate_filter.stream(
+                self._iter_kendra_pages(section, client_id)
+            )
+        )
 
-        The method keeps track of the entries that have been seen so far in
-        a set, so that if the same query returns the same result multiple
-        times, it is only included in the output once.
+    def _iter_kendra_pages(
+        self, section: ICDeckSection, client_id: str
+    ) -> Iterator[List[Dict[str, Any]]]:
         """
-        # Initialize empty list to store search results
-        results = []
+        Perform Kendra searches for the section and stream the unique results.
 
-        # Set to track unique entries and avoid duplicates
-        seen_entries = set()
-
-        # Iterate through each query defined for this section
-        for query in section.kendra_queries:
-            try:
-                # Make API call to Kendra search
-                response = self.kendra_client.retrieve(
-                    IndexId=self.kendra_index_id,
-                    QueryText=query,
-                    AttributeFilter={
-                        "EqualsTo": {
-                            "Key": "client_id",
-                            "Value": {"StringValue": client_id},
-                        }
-                    },
+        This method performs a Kendra search for each query in the section
+        and yields the result items page by page, so the near-duplicate filter
+        can sign each page in one batch.
+
+        The queries are issued concurrently through the shared retrieval pool,
+        and their results are yielded in query order so the output does not
+        depend on which call finishes first.
+
+        The method keeps track of the hashed entries that have been seen so far,
+        so that if the same query returns the same result multiple times, it is
+        only yielded once.
+
+        In adaptive mode the queries are ordered by their historical yield and
+        issued in waves; once a wave's share of new passages falls below the
+        configured ratio, the remaining queries are skipped. The yield of every
+        query that ran is recorded in both modes, as the share of its passages
+        that no other query of the run returned. Unlike the share that was new
+        when it arrived, this does not depend on the position the query ran at.
+        """
+        queries = list(section.kendra_queries)
+        wave_size = len(queries)
+        if self.adaptive_retrieval:
+            queries = self.query_yield.order(section.name, queries)
+            wave_size = self.adaptive_wave_size
+
+        # The query that first returned each entry, None once another query did too
+        owners: Dict[bytes, Optional[str]] = {}
+        returned = dict.fromkeys(queries, 0)
+        completed = []
+
+        try:
+            for start in range(0, len(queries), wave_size):
+                wave = queries[start : start + wave_size]
+
+                # Yield the results page by page as they arrive, in query and page order
+                wave_returned = wave_new = 0
+                for query, page in self._iter_wave_pages(wave, client_id, section):
+                    returned[query] += len(page)
+                    wave_returned += len(page)
+                    new_results = []
+                    for result in page:
+                        # Create unique identifier by hashing content and URI
+                        entry_id = passage_key(result)
+
+                        # Only keep the result if this is a new unique entry
+                        if entry_id not in owners:
+                            owners[entry_id] = query
+                            new_results.append(result)
+                        elif owners[entry_id] != query:
+                            owners[entry_id] = None
+                    wave_new += len(new_results)
+                    if new_results:
+                        yield new_results
+                completed.extend(wave)
+
+                # Skip the remaining queries once coverage has saturated
+                remaining = queries[start + wave_size :]
+                if (
+                    self.adaptive_retrieval
+                    and remaining
+                    and wave_new < self.adaptive_min_new_ratio * max(wave_returned, 1)
+                ):
+                    for query in remaining:
+                        self.query_yield.record_skipped(section.name, query)
+                    print(
+                        f"Retrieval for {section.name} saturated after "
+                        f"{len(queries) - len(remaining)} of {len(queries)} queries"
+                    )
+                    break
+        finally:
+            # Credit every query that ran with the entries only it returned
+            unique = Counter(owner for owner in owners.values() if owner is not None)
+            for query in completed:
+                self.query_yield.record(
+                    section.name, query, returned[query], unique[query]
                 )
 
-                # Process each result item returned by Kendra
-                for item in response.get("ResultItems", []):
-                    # Extract relevant fields from the result
-                    content = item.get("Content")
-                    document_uri = item.get("DocumentURI")
-
-                    # Create unique identifier by combining content and URI
-                    entry_id = f"{content}:{document_uri}"
-
-                    # Only add to results if this is a new unique entry
-                    if entry_id not in seen_entries:
-                        seen_entries.add(entry_id)
-                        results.append(
-                            {
-                                "content": content,
-                                "document_uri": document_uri,
-                            }
-                        )
+    def _iter_wave_pages(
+        self, wave: List[str], client_id: str, section: ICDeckSection
+    ) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Fetch the pages of a wave of queries and yield them in query and page order.
 
-            except Exception as e:
-                # Log any errors that occur during the search
-                print(f"Error searching Kendra for query '{query}': {str(e)}")
+        The first pages of all queries are requested at once. As soon as a
+        query's first page comes back full, its pages 2 to `max_pages` are
+        requested together; a short page ends its query and cancels the fetches
+        of its later pages. Up to one request per pool worker is in flight, and
+        no new request is made while `prefetch_pages` fetched pages wait to be
+        consumed, so the passages held in memory are bounded by the window and
+        the pool size rather than by the number of queries and pages. Fetches are
+        submitted from this thread rather than from a pool worker, so a saturated
+        pool never waits on itself.
+
+        Args:
+            wave (List[str]): The queries of the wave, in order.
+            client_id (str): The client whose documents are searched.
+            section (ICDeckSection): The section, with its page size and depth.
+
+        Yields:
+            Tuple[str, List[Dict[str, Any]]]: The query and one page of its results.
+        """
+        page_size = section.page_size
+        # Every page that may be fetched, in the order the pages are yielded
+        tasks = [
+            (query, page_number)
+            for query in wave
+            for page_number in range(1, section.max_pages + 1)
+        ]
+        # Fetches submitted but not consumed yet
+        futures: Dict[Tuple[str, int], Future] = {}
+        # Queries whose first page was full, and queries whose last page was seen
+        full_queries = set()
+        finished = set()
+
+        def requestable(task: Tuple[str, int]) -> bool:
+            query, page_number = task
+            if task in futures or query in finished:
+                return False
+            if page_number == 1 or query in full_queries:
+                return True
+            first = futures.get((query, 1))
+            if first is not None and first.done() and len(first.result()) >= page_size:
+                full_queries.add(query)
+                return True
+            return False
+
+        def top_up(position: int) -> None:
+            # The page to yield next is always requested; later ones are requested
+            # while pool workers are free and the fetched pages fit the window
+            for task in tasks[position:]:
+                if task != tasks[position]:
+                    in_flight = sum(not future.done() for future in futures.values())
+                    if (
+                        in_flight >= self.max_kendra_concurrency
+                        or len(futures) - in_flight >= self.prefetch_pages
+                    ):
+                        return
+                if requestable(task):
+                    futures[task] = self.retrieval_pool.submit(
+                        self._retrieve_query, task[0], client_id, task[1], page_size
+                    )
+
+        try:
+            for position, task in enumerate(tasks):
+                query = task[0]
+                if query in finished:
+                    continue
+
+                # Wait for the next page, requesting later pages as earlier ones land
+                top_up(position)
+                future = futures[task]
+                while not future.done():
+                    wait(
+                        [pending for pending in futures.values() if not pending.done()],
+                        return_when=FIRST_COMPLETED,
+                    )
+                    top_up(position)
+
+                page = futures.pop(task).result()
+                if len(page) >= page_size:
+                    full_queries.add(query)
+                else:
+                    # A short page is the last one, drop the query's remaining fetches
+                    finished.add(query)
+                    for other in [other for other in futures if other[0] == query]:
+                        futures.pop(other).cancel()
+                yield query, page
+        finally:
+            # Drop the fetches nobody will consume, e.g. when the consumer stops early
+            for pending in futures.values():
+                pending.cancel()
+
+    def _retrieve_query(
+        self,
+        query: str,
+        client_id: str,
+        page_number: int = 1,
+        page_size: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve one page of passages for a single Kendra query.
+
+        Args:
+            query (str): The query text to search for.
+            client_id (str): The client whose documents are searched.
+            page_number (int): The page to retrieve. Defaults to 1.
+            page_size (Optional[int]): Passages per page, None for the Kendra default.
+
+        Returns:
+            List[Dict[str, Any]]: The result items with their content and document URI.
+            An empty list is returned if the search fails.
+        """
+        start_time = time.perf_counter()
+        results = []
+        try:
+            # Serve the query from the cache when one is configured
+            if self.retrieval_cache is not None:
+                results = self.retrieval_cache.get_or_fetch(
+                    self.kendra_index_id,
+                    client_id,
+                    query,
+                    lambda: self._fetch_query(query, client_id, page_number, page_size),
+                    page_number=page_number,
+                    page_size=page_size,
+                )
+            else:
+                results = self._fetch_query(query, client_id, page_number, page_size)
+        except Exception as e:
+            # Log any errors that occur during the search
+            print(f"Error searching Kendra for query '{query}': {str(e)}")
+
+        # Record the page count and timing of the query
+        elapsed = time.perf_counter() - start_time
+        with self._retrieval_stats_lock:
+            stats = self._retrieval_stats.setdefault(client_id, {}).setdefault(
+                query, {"pages": 0, "results": 0, "seconds": 0.0, "page_seconds": {}}
+            )
+            stats["pages"] += 1
+            stats["results"] += len(results)
+            stats["seconds"] += elapsed
+            stats["page_seconds"][page_number] = round(elapsed, 4)
 
-        # Return deduplicated results
         return results
+
+    def retrieval_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Report the pages fetched per query.
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: Per client and query the number of
+            pages and results fetched, the total seconds spent and the seconds per
+            page number.
+        """
+        with self._retrieval_stats_lock:
+            return {
+                client_id: {
+                    query: {**stats, "page_seconds": dict(stats["page_seconds"])}
+                    for query, stats in queries.items()
+                }
+                for client_id, queries in self._retrieval_stats.items()
+            }
+
+    def _fetch_query(
+        self,
+        query: str,
+        client_id: str,
+        page_number: int = 1,
+        page_size: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Call Kendra retrieve for one page of a single query.
+
+        Args:
+            query (str): The query text to search for.
+            client_id (str): The client whose documents are searched.
+            page_number (int): The page to retrieve. Defaults to 1.
+            page_size (Optional[int]): Passages per page, None for the Kendra default.
+
+        Returns:
+            List[Dict[str, Any]]: The result items with their content and document URI.
+        """
+        # Only send the paging parameters that differ from the Kendra defaults
+        paging = {}
+        if page_size is not None:
+            paging["PageSize"] = page_size
+        if page_number != 1:
+            paging["PageNumber"] = page_number
+
+        # Make API call to Kendra search
+        response = self.kendra_client.retrieve(
+            IndexId=self.kendra_index_id,
+            QueryText=query,
+            AttributeFilter={
+                "EqualsTo": {
+                    "Key": "client_id",
+                    "Value": {"StringValue": client_id},
+                }
+            },
+            **paging,
+        )
+
+        # Extract relevant fields from each result item returned by Kendra
+        return [
+            {
+                "content": item.get("Content"),
+                "document_uri": item.get("DocumentURI"),
+            }
+            for item in response.get("ResultItems", [])
+        ]
@@ -1,7 +1,7 @@
-import boto3
 from typing import List, Dict, Any
 import logging
 from botocore.exceptions import ClientError
+from src.utils.aws_clients import get_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,12 +11,12 @@ logger = logging.getLogger(__name__)
 class KendraDataSource:
     def __init__(self, region_name: str = "us-east-1"):
         """
-        Initialize KendraDataSource with boto3 client.
+        Initialize KendraDataSource with the shared boto3 client.
 
         Args:
             region_name (str): AWS region name. Defaults to "us-east-1".
         """
-        self.kendra = boto3.client("kendra", region_name=region_name)
+        self.kendra = get_client("kendra", region_name=region_name)
 
     def get_client_ids(self, index_id: str, data_source_ids: List[str]) -> List[str]:
         """
@@ -86,3 +86,56 @@ class KendraDataSource:
             logger.error(f"Error listing data sources for index {index_id}: {str(e)}")
 
         return data_source_ids
+
+    def get_client_sync_times(
+        self, index_id: str, data_source_ids: List[str]
+    ) -> Dict[str, float]:
+        """
+        Get the time each client's documents were last synced.
+
+        Args:
+            index_id (str): Kendra index ID
+            data_source_ids (List[str]): List of data source IDs
+
+        Returns:
+            Dict[str, float]: The UNIX timestamp at which the latest completed sync
+            job of each client's data source ended, keyed by client ID
+        """
+        sync_times: Dict[str, float] = {}
+
+        for data_source in data_source_ids:
+            try:
+                # Find the latest sync job that finished with new documents
+                last_sync = None
+                request = {"Id": data_source, "IndexId": index_id}
+                while True:
+                    response = self.kendra.list_data_source_sync_jobs(**request)
+                    for job in response.get("History", []):
+                        end_time = job.get("EndTime")
+                        if end_time is None or job.get("Status") not in (
+                            "SUCCEEDED",
+                            "INCOMPLETE",
+                        ):
+                            continue
+                        if last_sync is None or end_time.timestamp() > last_sync:
+                            last_sync = end_time.timestamp()
+
+                    # Follow the pagination token until every job was seen
+                    if not response.get("NextToken"):
+                        break
+                    request["NextToken"] = response["NextToken"]
+
+                if last_sync is None:
+                    continue
+
+                # Attribute the sync time to every client of the data source
+                for client_id in self.get_client_ids(index_id, [data_source]):
+                    sync_times[client_id] = max(
+                        sync_times.get(client_id, 0.0), last_sync
+                    )
+            except ClientError as e:
+                logger.error(
+                    f"Error listing sync jobs for data source {data_source}: {str(e)}"
+                )
+
+        return sync_times
@@ -0,0 +1,419 @@
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+from src.pipeline.context_packer import TERM_PATTERN
+from src.utils.local_state import LOCAL_STATE_DIR
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Default location of the persisted index
+DEFAULT_INDEX_PATH = os.path.join(LOCAL_STATE_DIR, "local_retrieval_index")
+
+# Prefix of the folders holding the documents of one client
+CLIENT_FOLDER_PREFIX = "client_"
+
+
+class LocalRetriever:
+    """
+    An offline stand-in for the Kendra retrieve API.
+
+    Text is extracted from PDFs, split into overlapping passages and indexed in
+    a BM25 inverted index. `retrieve` accepts the arguments `ICDeckProcessor`
+    passes to Kendra, honors the client_id attribute filter, and answers with
+    `ResultItems` carrying `Content` and `DocumentURI`, so the pipeline can be
+    developed and load-tested without a live index.
+
+    Documents inside a `client_<name>/` folder belong to client `<name>`; all
+    other documents belong to the default client, the name of the source folder
+    (e.g. "sample_input" for demo/sample_input).
+
+    The index is persisted as NumPy arrays (postings in CSR layout) in an .npz
+    file next to a JSON file with the vocabulary, the passages and the size and
+    modification time of every source PDF, so a stale index can be detected.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        term_offsets: np.ndarray,
+        posting_passages: np.ndarray,
+        posting_frequencies: np.ndarray,
+        passage_lengths: np.ndarray,
+        passage_clients: np.ndarray,
+        passages: List[Dict[str, str]],
+        clients: List[str],
+        k1: float = 1.5,
+        b: float = 0.75,
+        sources: Optional[Dict[str, List[int]]] = None,
+    ):
+        """
+        Initialize the retriever from the arrays of a built index.
+
+        Use `build`, `load` or `load_or_build` instead of calling this directly.
+
+        Args:
+            terms (List[str]): The vocabulary, sorted.
+            term_offsets (np.ndarray): Start of each term's postings, plus the end.
+            posting_passages (np.ndarray): Passage index of every posting.
+            posting_frequencies (np.ndarray): Term frequency of every posting.
+            passage_lengths (np.ndarray): Number of terms of every passage.
+            passage_clients (np.ndarray): Client index of every passage.
+            passages (List[Dict[str, str]]): The "content" and "document_uri" of every
+                passage.
+            clients (List[str]): The client IDs.
+            k1 (float): BM25 term frequency saturation. Defaults to 1.5.
+            b (float): BM25 length normalization. Defaults to 0.75.
+            sources (Optional[Dict[str, List[int]]]): The source PDFs the index was
+                built from, as returned by `source_fingerprint`.
+        """
+        self.terms = terms
+        self.term_ids = {term: index for index, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.posting_passages = posting_passages
+        self.posting_frequencies = posting_frequencies
+        self.passage_lengths = passage_lengths
+        self.passage_clients = passage_clients
+        self.passages = passages
+        self.clients = clients
+        self.k1 = k1
+        self.b = b
+        self.sources = sources
+
+        # Identifies the indexed content, used as the index ID in cache keys
+        self.index_id = (
+            "local-"
+            + hashlib.sha256(
+                json.dumps([clients, passages], sort_keys=True).encode("utf-8")
+            ).hexdigest()[:16]
+        )
+
+    @staticmethod
+    def source_fingerprint(source_dir: str) -> Dict[str, List[int]]:
+        """
+        Describe the PDFs under a folder by their size and modification time.
+
+        Args:
+            source_dir (str): Folder searched recursively for PDFs.
+
+        Returns:
+            Dict[str, List[int]]: The size in bytes and the modification time in
+            nanoseconds of every PDF, keyed by its resolved path.
+        """
+        fingerprint = {}
+        for pdf_path in sorted(Path(source_dir).resolve().rglob("*.pdf")):
+            stat = pdf_path.stat()
+            fingerprint[str(pdf_path)] = [stat.st_size, stat.st_mtime_ns]
+        return fingerprint
+
+    @classmethod
+    def build(
+        cls,
+        source_dir: str,
+        passage_words: int = 120,
+        overlap_words: int = 30,
+    ) -> "LocalRetriever":
+        """
+        Build the index from the PDFs under a folder.
+
+        Args:
+            source_dir (str): Folder searched recursively for PDFs.
+            passage_words (int): Words per passage. Defaults to 120.
+            overlap_words (int): Words shared by consecutive passages. Defaults to 30.
+
+        Returns:
+            LocalRetriever: The retriever over the extracted passages.
+        """
+        from pypdf import PdfReader  # Only needed when building an index
+
+        source = Path(source_dir).resolve()
+        step = max(1, passage_words - overlap_words)
+        # Taken before reading, so PDFs changed while indexing trigger a rebuild
+        sources = cls.source_fingerprint(source_dir)
+
+        clients: List[str] = []
+        passages: List[Dict[str, str]] = []
+        passage_clients: List[int] = []
+        passage_terms: List[List[str]] = []
+
+        for pdf_path in sorted(source.rglob("*.pdf")):
+            # The nearest client_<name> folder decides the client of the document
+            client_id = source.name
+            for parent in pdf_path.relative_to(source).parents:
+                if parent.name.startswith(CLIENT_FOLDER_PREFIX):
+                    client_id = parent.name[len(CLIENT_FOLDER_PREFIX) :]
+                    break
+            if client_id not in clients:
+                clients.append(client_id)
+
+            try:
+                reader = PdfReader(str(pdf_path))
+                words = " ".join(
+                    page.extract_text() or "" for page in reader.pages
+                ).split()
+            except Exception as e:
+                print(f"Error extracting text from {pdf_path}: {str(e)}")
+                continue
+
+            # Cut the text into overlapping windows of words
+            for start in range(0, max(1, len(words) - overlap_words), step):
+                content = " ".join(words[start : start + passage_words])
+                if not content:
+                    continue
+                passages.append({"content": content, "document_uri": pdf_path.as_uri()})
+                passage_clients.append(clients.index(client_id))
+                passage_terms.append(TERM_PATTERN.findall(content.lower()))
+
+        # Invert the passages into per-term postings
+        terms = sorted({term for terms_ in passage_terms for term in terms_})
+        term_ids = {term: index for index, term in enumerate(terms)}
+        postings: List[Dict[int, int]] = [{} for _ in terms]
+        for passage_index, terms_ in enumerate(passage_terms):
+            for term in terms_:
+                frequencies = postings[term_ids[term]]
+                frequencies[passage_index] = frequencies.get(passage_index, 0) + 1
+
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(frequencies) for frequencies in postings])
+        posting_passages = np.fromiter(
+            (index for frequencies in postings for index in frequencies),
+            dtype=np.int32,
+            count=int(term_offsets[-1]),
+        )
+        posting_frequencies = np.fromiter(
+            (count for frequencies in postings for count in frequencies.values()),
+            dtype=np.float32,
+            count=int(term_offsets[-1]),
+        )
+
+        return cls(
+            terms=terms,
+            term_offsets=term_offsets,
+            posting_passages=posting_passages,
+            posting_frequencies=posting_frequencies,
+            passage_lengths=np.array(
+                [len(terms_) for terms_ in passage_terms], dtype=np.int32
+            ),
+            passage_clients=np.array(passage_clients, dtype=np.int32),
+            passages=passages,
+            clients=clients,
+            sources=sources,
+        )
+
+    def save(self, index_path: Optional[str] = None) -> None:
+        """
+        Persist the index.
+
+        Args:
+            index_path (Optional[str]): Path of the index without extension. Defaults to
+                LOCAL_INDEX_PATH or /tmp/local_retrieval_index.
+        """
+        index_path = index_path or os.environ.get(
+            "LOCAL_INDEX_PATH", DEFAULT_INDEX_PATH
+        )
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        np.savez(
+            f"{index_path}.npz",
+            term_offsets=self.term_offsets,
+            posting_passages=self.posting_passages,
+            posting_frequencies=self.posting_frequencies,
+            passage_lengths=self.passage_lengths,
+            passage_clients=self.passage_clients,
+        )
+        with open(f"{index_path}.json", "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "terms": self.terms,
+                    "passages": self.passages,
+                    "clients": self.clients,
+                    "k1": self.k1,
+                    "b": self.b,
+                    "sources": self.sources,
+                },
+                file,
+            )
+
+    @classmethod
+    def load(cls, index_path: Optional[str] = None) -> "LocalRetriever":
+        """
+        Load a persisted index.
+
+        Args:
+            index_path (Optional[str]): Path of the index without extension. Defaults to
+                LOCAL_INDEX_PATH or /tmp/local_retrieval_index.
+
+        Returns:
+            LocalRetriever: The retriever over the persisted index.
+        """
+        index_path = index_path or os.environ.get(
+            "LOCAL_INDEX_PATH", DEFAULT_INDEX_PATH
+        )
+        with open(f"{index_path}.json", "r", encoding="utf-8") as file:
+            metadata = json.load(file)
+        with np.load(f"{index_path}.npz") as arrays:
+            return cls(
+                terms=metadata["terms"],
+                term_offsets=arrays["term_offsets"],
+                posting_passages=arrays["posting_passages"],
+                posting_frequencies=arrays["posting_frequencies"],
+                passage_lengths=arrays["passage_lengths"],
+                passage_clients=arrays["passage_clients"],
+                passages=metadata["passages"],
+                clients=metadata["clients"],
+                k1=metadata["k1"],
+                b=metadata["b"],
+                sources=metadata.get("sources"),
+            )
+
+    @classmethod
+    def load_or_build(
+        cls, source_dir: Optional[str] = None, index_path: Optional[str] = None
+    ) -> "LocalRetriever":
+        """
+        Load the persisted index, building and saving it first if it does not exist.
+
+        An index is rebuilt when the PDFs under the source folder were added,
+        removed or modified since it was built, or when it does not record them.
+
+        Args:
+            source_dir (Optional[str]): Folder of the PDFs. Defaults to LOCAL_SOURCE_DIR
+                or demo/sample_input.
+            index_path (Optional[str]): Path of the index without extension. Defaults to
+                LOCAL_INDEX_PATH or /tmp/local_retrieval_index.
+
+        Returns:
+            LocalRetriever: The retriever.
+        """
+        index_path = index_path or os.environ.get(
+            "LOCAL_INDEX_PATH", DEFAULT_INDEX_PATH
+        )
+        source_dir = source_dir or os.environ.get(
+            "LOCAL_SOURCE_DIR", "demo/sample_input"
+        )
+        if os.path.exists(f"{index_path}.npz") and os.path.exists(f"{index_path}.json"):
+            retriever = cls.load(index_path)
+            if retriever.sources == cls.source_fingerprint(source_dir):
+                return retriever
+            print(f"Source documents under {source_dir} changed, rebuilding the index")
+
+        retriever = cls.build(source_dir)
+        retriever.save(index_path)
+        return retriever
+
+    def get_client_ids(self) -> List[str]:
+        """
+        Get the IDs of the clients with indexed documents.
+
+        Returns:
+            List[str]: The client IDs.
+        """
+        return list(self.clients)
+
+    def retrieve(
+        self,
+        IndexId: str,
+        QueryText: str,
+        AttributeFilter: Optional[Dict[str, Any]] = None,
+        PageSize: int = 10,
+        PageNumber: int = 1,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Search the index like Kendra's retrieve API.
+
+        Args:
+            IndexId (str): Ignored, there is a single local index.
+            QueryText (str): The query.
+            AttributeFilter (Optional[Dict[str, Any]]): An EqualsTo filter on client_id.
+            PageSize (int): Results per page. Defaults to 10.
+            PageNumber (int): The 1-based page to return. Defaults to 1.
+
+        Returns:
+            Dict[str, Any]: The response with its ResultItems, best first.
+
+        Raises:
+            ValueError: If the attribute filter is not an EqualsTo filter on client_id.
+        """
+        scores = self.score(QueryText)
+
+        # Only keep the passages of the filtered client
+        if AttributeFilter:
+            equals_to = AttributeFilter.get("EqualsTo", {})
+            if equals_to.get("Key") != "client_id":
+                raise ValueError(f"Unsupported attribute filter: {AttributeFilter}")
+            client_id = equals_to["Value"]["StringValue"]
+            if client_id not in self.clients:
+                scores = np.zeros(0, dtype=np.float32)
+            else:
+                scores = np.where(
+                    self.passage_clients == self.clients.index(client_id), scores, 0
+                )
+
+        # Rank the matching passages and cut out the requested page
+        matches = np.flatnonzero(scores > 0)
+        ranked = matches[np.argsort(-scores[matches], kind="stable")]
+        start = (max(1, PageNumber) - 1) * PageSize
+        page = ranked[start : start + PageSize]
+
+        return {
+            "QueryId": hashlib.sha1(QueryText.encode("utf-8")).hexdigest(),
+            "ResultItems": [
+                {
+                    "Id": f"{self.index_id}-{index}",
+                    "DocumentId": self.passages[index]["document_uri"],
+                    "DocumentURI": self.passages[index]["document_uri"],
+                    "Content": self.passages[index]["content"],
+                    "ScoreAttributes": {"ScoreConfidence": "NOT_AVAILABLE"},
+                }
+                for index in page
+            ],
+        }
+
+    def score(self, query: str) -> np.ndarray:
+        """
+        Compute the BM25 score of every passage for a query.
+
+        Args:
+            query (str): The query text.
+
+        Returns:
+            np.ndarray: One score per passage.
+        """
+        passage_count = len(self.passages)
+        scores = np.zeros(passage_count, dtype=np.float32)
+        if not passage_count:
+            return scores
+
+        average_length = max(float(self.passage_lengths.mean()), 1.0)
+        length_norm = self.k1 * (
+            1 - self.b + self.b * self.passage_lengths / average_length
+        )
+
+        for term in set(TERM_PATTERN.findall(query.lower())):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+
+            # Add the term's contribution to every passage that contains it
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            passages = self.posting_passages[start:end]
+            frequencies = self.posting_frequencies[start:end]
+            idf = math.log(
+                1 + (passage_count - (end - start) + 0.5) / (end - start + 0.5)
+            )
+            scores[passages] += (
+                idf
+                * frequencies
+                * (self.k1 + 1)
+                / (frequencies + length_norm[passages])
+            )
+
+        return scores
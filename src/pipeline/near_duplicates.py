@@ -0,0 +1,187 @@
+import hashlib
+import os
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Mersenne prime used as the modulus of the MinHash permutations
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+# Rows per block of kept signatures in `stream`; blocks are added, never copied
+SIGNATURE_BLOCK_ROWS = 256
+
+
+def passage_key(result: Dict[str, Any]) -> bytes:
+    """
+    Build the exact-duplicate key of a passage.
+
+    Args:
+        result (Dict[str, Any]): A search result with "content" and "document_uri".
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest of the content and document URI.
+    """
+    return hashlib.blake2b(
+        f"{result['content']}\0{result['document_uri']}".encode("utf-8"),
+        digest_size=16,
+    ).digest()
+
+
+class NearDuplicateFilter:
+    """
+    Drop passages that are near duplicates of an earlier passage.
+
+    Every passage is split into overlapping word shingles and summarized by a
+    MinHash signature; the fraction of equal signature slots estimates the
+    Jaccard similarity of two passages. The signatures of each batch of
+    passages are computed with one set of NumPy operations. A passage is dropped when its
+    estimated similarity to a passage kept before it reaches the threshold,
+    regardless of the document it comes from, so overlapping excerpts of one
+    page and boilerplate repeated across PDFs are only sent once.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_permutations: int = 64,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        """
+        Initialize the filter.
+
+        Args:
+            threshold (Optional[float]): Estimated Jaccard similarity at which a passage
+                counts as a duplicate. Defaults to NEAR_DUPLICATE_THRESHOLD or 0.8;
+                0 disables the filter.
+            num_permutations (int): Length of the MinHash signatures. Defaults to 64.
+            shingle_size (int): Number of words per shingle. Defaults to 5.
+            seed (int): Seed of the hash permutations. Defaults to 1.
+        """
+        self.threshold = (
+            threshold
+            if threshold is not None
+            else float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+        )
+        self.shingle_size = shingle_size
+
+        # Random permutations h(x) = (a * x + b) mod p, one per signature slot
+        generator = np.random.default_rng(seed)
+        self._a = generator.integers(
+            1, MERSENNE_PRIME, size=(num_permutations, 1), dtype=np.uint64
+        )
+        self._b = generator.integers(
+            0, MERSENNE_PRIME, size=(num_permutations, 1), dtype=np.uint64
+        )
+
+    def shingle_hashes(self, text: str) -> List[int]:
+        """
+        Hash the word shingles of a text.
+
+        Args:
+            text (str): The passage text.
+
+        Returns:
+            List[int]: One 32-bit hash per distinct shingle; texts shorter than a
+            shingle are hashed as a whole.
+        """
+        words = (text or "").lower().split()
+        count = max(1, len(words) - self.shingle_size + 1)
+        return list(
+            {
+                zlib.crc32(" ".join(words[i : i + self.shingle_size]).encode("utf-8"))
+                for i in range(count)
+            }
+        )
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        Compute the MinHash signatures of several texts at once.
+
+        Args:
+            texts (List[str]): The passage texts.
+
+        Returns:
+            np.ndarray: A (len(texts), num_permutations) array of signatures. The
+            values are below the 31-bit modulus, so they are stored as uint32.
+        """
+        if not texts:
+            return np.empty((0, self._a.shape[0]), dtype=np.uint32)
+
+        # Lay out the shingles of all passages in one array, with the offset of
+        # each passage's first shingle
+        hashes = [
+            np.array(self.shingle_hashes(text), dtype=np.uint64) for text in texts
+        ]
+        offsets = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+        shingles = np.concatenate(hashes) % MERSENNE_PRIME
+        del hashes
+
+        # Permute every shingle, then take the minimum per passage. One permutation
+        # at a time, so the scratch memory stays at one row of the batch's shingles
+        result = np.empty((len(texts), self._a.shape[0]), dtype=np.uint32)
+        permuted = np.empty_like(shingles)
+        for index, (a, b) in enumerate(zip(self._a[:, 0], self._b[:, 0])):
+            np.multiply(shingles, a, out=permuted)
+            np.add(permuted, b, out=permuted)
+            np.remainder(permuted, MERSENNE_PRIME, out=permuted)
+            result[:, index] = np.minimum.reduceat(permuted, offsets)
+        return result
+
+    def stream(
+        self, batches: Iterable[List[Dict[str, Any]]]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Remove near-duplicate passages from a stream, keeping the first occurrence.
+
+        The passages arrive in micro-batches, e.g. one retrieve page at a time.
+        Each batch is signed with one set of NumPy operations, and only the
+        signatures of the kept passages are held in memory. They are stored in
+        fixed-size blocks, so growing the set never copies it.
+
+        Args:
+            batches (Iterable[List[Dict[str, Any]]]): Search results with "content",
+                in batches.
+
+        Yields:
+            Dict[str, Any]: The results without near duplicates, in their original order.
+        """
+        if not 0 < self.threshold <= 1:
+            for batch in batches:
+                yield from batch
+            return
+
+        # Signatures of the kept passages, the last block filled up to kept_count
+        blocks: List[np.ndarray] = []
+        kept_count = 0
+        for batch in batches:
+            signatures = self.signatures([result["content"] for result in batch])
+            for result, signature in zip(batch, signatures):
+                if self._matches_kept(blocks, kept_count, signature):
+                    continue
+
+                if kept_count == len(blocks) * SIGNATURE_BLOCK_ROWS:
+                    blocks.append(
+                        np.empty(
+                            (SIGNATURE_BLOCK_ROWS, self._a.shape[0]), dtype=np.uint32
+                        )
+                    )
+                blocks[-1][kept_count % SIGNATURE_BLOCK_ROWS] = signature
+                kept_count += 1
+                yield result
+
+    def _matches_kept(
+        self, blocks: List[np.ndarray], kept_count: int, signature: np.ndarray
+    ) -> bool:
+        """Check whether a signature reaches the threshold against a kept passage."""
+        for index, block in enumerate(blocks):
+            rows = block[
+                : min(SIGNATURE_BLOCK_ROWS, kept_count - index * SIGNATURE_BLOCK_ROWS)
+            ]
+            if (rows == signature).mean(axis=1).max() >= self.threshold:
+                return True
+        return False
@@ -149,3 +149,17 @@ Draft a detailed financial overview section using the provided information: {{in
 - References should be unique and cited appropriately using [1], [2], etc.  
 - Stick to the given format without adding additional text, introductory phrases, or warnings.  
 """
+
+REDUCE_PROMPT = """Merge partial drafts into one {{section}} section for the Investment Committee deck. Each draft was written from a different excerpt of the same data room: {{input}}. Adhere strictly to the structure and formatting guidelines outlined below.  
+
+**Requirements**:  
+- Keep the headings, numbering and order of the drafts; combine the points each heading has in the drafts into one list.  
+- Merge overlapping points into one and keep every distinct figure, metric and date.  
+- Where drafts disagree, keep both statements with their references.  
+- Keep every bracketed reference number, e.g. [3], exactly as it appears in the drafts. Do not renumber references.  
+- End with a **References** section listing every number cited in the merged text with its document from the references given, in ascending order. Example:  
+      3. URL3/Section/Page  
+      7. URL7/Section/Page  
+- Do not add information, references or sections that are not in the drafts.  
+- Stick to the given format without adding additional text, introductory phrases, or warnings.  
+"""
@@ -0,0 +1,205 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from src.utils.deck_formats import parse_sections, render_format
+from src.utils.document_model import Section
+
+# Load environment variables
+load_dotenv()
+
+# Workers are started from a clean server process (or spawned where forkserver is
+# unavailable) instead of forking a process whose threads may be inside boto3 calls
+START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def available_cores() -> int:
+    """
+    Count the cores this process may run on.
+
+    Returns:
+        int: The cores in the scheduler affinity mask where supported, otherwise
+        os.cpu_count().
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class RenderStage:
+    """
+    Renders finished decks to PDF, PPTX or both off the event loop.
+
+    Decks are put on a queue and picked up by one consumer task per worker,
+    each handing the CPU-bound work to a process pool: the sections are parsed
+    once, then every requested format renders from that document concurrently.
+    Rendering one client's deck thus never holds the GIL of the process that is
+    waiting on Bedrock and Kendra for the others. Where worker processes cannot
+    be started (Lambda has no /dev/shm for the pool's semaphores) the stage
+    renders in threads instead, which still keeps the event loop free.
+
+    Use it as an async context manager:
+
+        async with RenderStage() as render_stage:
+            files = await render_stage.render(sections, ["pdf", "pptx"])
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the stage.
+
+        Args:
+            max_workers (Optional[int]): Number of decks rendered at once. Defaults to
+                RENDER_WORKERS, or the available cores if that is 0 or unset.
+        """
+        self.max_workers = max(
+            1,
+            max_workers
+            or int(os.environ.get("RENDER_WORKERS", "0"))
+            or available_cores(),
+        )
+        self.executor: Optional[Executor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumers: List[asyncio.Task] = []
+
+    async def __aenter__(self) -> "RenderStage":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        """
+        Create the worker pool and start the consumer tasks.
+
+        Call it before any client threads run: the worker processes are started
+        here rather than on the first deck.
+        """
+        self.executor = self._create_executor()
+        self._queue = asyncio.Queue()
+        self._consumers = [
+            asyncio.create_task(self._consume()) for _ in range(self.max_workers)
+        ]
+
+    async def close(self) -> None:
+        """Finish the queued decks, then stop the consumers and the worker pool."""
+        for _ in self._consumers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._consumers)
+        self._consumers = []
+        self.executor.shutdown(wait=True)
+
+    async def render(
+        self, sections: Dict[str, str], formats: Optional[List[str]] = None
+    ) -> Dict[str, bytes]:
+        """
+        Queue a deck for parsing and rendering and wait for the documents.
+
+        Args:
+            sections (Dict[str, str]): The generated text keyed by section name, as
+                returned by ICDeckProcessor.generate_deck.
+            formats (Optional[List[str]]): The output formats. Defaults to PDF only.
+
+        Returns:
+            Dict[str, bytes]: The rendered documents keyed by format.
+        """
+        return await self._submit(sections, None, formats or ["pdf"])
+
+    async def render_parsed(
+        self, document: List[Section], formats: List[str]
+    ) -> Dict[str, bytes]:
+        """
+        Queue an already parsed deck for rendering and wait for the documents.
+
+        Args:
+            document (List[Section]): The parsed sections of the deck.
+            formats (List[str]): The output formats.
+
+        Returns:
+            Dict[str, bytes]: The rendered documents keyed by format.
+        """
+        return await self._submit(None, document, formats)
+
+    async def _submit(
+        self,
+        sections: Optional[Dict[str, str]],
+        document: Optional[List[Section]],
+        formats: List[str],
+    ) -> Dict[str, bytes]:
+        """Queue a deck and wait for its documents."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sections, document, formats, future))
+        return await future
+
+    def _create_executor(self) -> Executor:
+        """Start the process pool, or a thread pool where processes are unavailable."""
+        try:
+            context = multiprocessing.get_context(START_METHOD)
+            if START_METHOD == "forkserver":
+                # Workers fork from a server that has the renderers imported already
+                context.set_forkserver_preload(["src.utils.deck_formats"])
+            executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=context
+            )
+            # Start every worker now instead of on the first submitted deck
+            for future in [executor.submit(os.getpid) for _ in range(self.max_workers)]:
+                future.result()
+            return executor
+        except (OSError, NotImplementedError, ImportError, BrokenProcessPool) as e:
+            print(f"Process pool unavailable ({str(e)}), rendering decks in threads")
+            return ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="render"
+            )
+
+    async def _consume(self) -> None:
+        """Render queued decks until the stop marker arrives."""
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            sections, document, formats, future = item
+
+            try:
+                if document is None:
+                    # Parse once; every format renders from the same document model
+                    document = await self._run(parse_sections, sections)
+                outputs = await asyncio.gather(
+                    *(
+                        self._run(render_format, output_format, document)
+                        for output_format in formats
+                    )
+                )
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                # The caller may have been cancelled while the deck was rendering
+                if not future.done():
+                    future.set_result(dict(zip(formats, outputs)))
+
+    async def _run(self, function, *args):
+        """Run a function in the worker pool, falling back to threads if the pool breaks."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, function, *args)
+        except BrokenProcessPool as e:
+            # Worker processes died or could not start; render in threads from now on
+            self._fall_back_to_threads(e)
+            return await loop.run_in_executor(self.executor, function, *args)
+
+    def _fall_back_to_threads(self, error: Exception) -> None:
+        """Replace a broken process pool with a thread pool, once."""
+        if isinstance(self.executor, ThreadPoolExecutor):
+            return
+        print(f"Process pool broken ({str(error)}), rendering decks in threads")
+        self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="render"
+        )
@@ -0,0 +1,140 @@
+import functools
+import itertools
+import os
+import zlib
+from typing import Any, Dict, List, Optional
+import numpy as np
+from src.pipeline.context_packer import TERM_PATTERN
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Terms whose hash bucket is remembered across sections, filings reuse most of
+# their vocabulary
+TERM_BUCKET_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=TERM_BUCKET_CACHE_SIZE)
+def term_bucket(term: str, dimensions: int) -> int:
+    """
+    Hash a term into one of the buckets of the term vectors.
+
+    Args:
+        term (str): The term.
+        dimensions (int): Number of hash buckets.
+
+    Returns:
+        int: The bucket of the term.
+    """
+    return zlib.crc32(term.encode("utf-8")) % dimensions
+
+
+class PassageReranker:
+    """
+    Rank a section's passages against all of its queries at once.
+
+    Passages and queries are embedded as hashed TF-IDF vectors: every term is
+    hashed into one of `dimensions` buckets, term frequencies are dampened
+    logarithmically and weighted by their inverse document frequency among the
+    candidate passages. A passage scores the best cosine similarity it reaches
+    with any of the section's queries, and only the `top_k` best passages are
+    kept. Everything runs on a few NumPy matrices, without any model download.
+    """
+
+    def __init__(self, top_k: Optional[int] = None, dimensions: int = 4096):
+        """
+        Initialize the reranker.
+
+        Args:
+            top_k (Optional[int]): Number of passages kept per section. Defaults to
+                RERANK_TOP_K or 20.
+            dimensions (int): Number of hash buckets of the term vectors. Defaults to 4096.
+        """
+        self.top_k = (
+            top_k if top_k is not None else int(os.environ.get("RERANK_TOP_K", "20"))
+        )
+        self.dimensions = dimensions
+
+    def term_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Count the hashed terms of several texts.
+
+        Args:
+            texts (List[str]): The texts.
+
+        Returns:
+            np.ndarray: A (len(texts), dimensions) array of term counts.
+        """
+        term_lists = [TERM_PATTERN.findall((text or "").lower()) for text in texts]
+
+        # Hash every distinct term once per call
+        buckets = {
+            term: term_bucket(term, self.dimensions)
+            for term in set().union(*term_lists)
+        }
+
+        # Flatten the (text, bucket) pairs and count them in one pass
+        lengths = [len(terms) for terms in term_lists]
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        columns = np.fromiter(
+            map(buckets.__getitem__, itertools.chain.from_iterable(term_lists)),
+            dtype=np.int64,
+            count=sum(lengths),
+        )
+        counts = np.bincount(
+            rows * self.dimensions + columns, minlength=len(texts) * self.dimensions
+        )
+        return counts.reshape(len(texts), self.dimensions).astype(np.float32)
+
+    def score(self, passages: List[str], queries: List[str]) -> np.ndarray:
+        """
+        Score every passage against every query.
+
+        Args:
+            passages (List[str]): The passage texts.
+            queries (List[str]): The query texts.
+
+        Returns:
+            np.ndarray: The best cosine similarity of each passage with any query.
+        """
+        if not passages or not queries:
+            return np.zeros(len(passages), dtype=np.float32)
+
+        passage_counts = self.term_matrix(passages)
+        query_counts = self.term_matrix(queries)
+
+        # Inverse document frequency of each bucket among the candidate passages
+        document_frequency = np.count_nonzero(passage_counts, axis=0)
+        idf = (np.log((1 + len(passages)) / (1 + document_frequency)) + 1).astype(
+            np.float32
+        )
+
+        # Dampened term frequency weighted by idf, normalized to unit length
+        def embed(counts: np.ndarray) -> np.ndarray:
+            weights = np.log1p(counts) * idf
+            norms = np.linalg.norm(weights, axis=1, keepdims=True)
+            return weights / np.maximum(norms, 1e-12)
+
+        similarities = embed(passage_counts) @ embed(query_counts).T
+        return similarities.max(axis=1)
+
+    def rerank(
+        self, results: List[Dict[str, Any]], queries: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Keep the passages most relevant to the section's queries.
+
+        Args:
+            results (List[Dict[str, Any]]): The search results with "content".
+            queries (List[str]): The section's queries.
+
+        Returns:
+            List[Dict[str, Any]]: At most `top_k` results, best first, each with its
+            relevance in a "score" key.
+        """
+        scores = self.score([result["content"] for result in results], queries)
+
+        # Stable sort so equally scored passages keep their retrieval order
+        order = np.argsort(-scores, kind="stable")[: max(0, self.top_k)]
+        return [{**results[index], "score": float(scores[index])} for index in order]
@@ -1,17 +1,17 @@
 import json
-import boto3
 import time
 from typing import Dict, Any
 from botocore.exceptions import ClientError
 import os
 from dotenv import load_dotenv
+from src.utils.aws_clients import get_client
 
 # Load environment variables
 load_dotenv()
 
 # Initialize AWS clients
-s3_client = boto3.client("s3")
-kendra_client = boto3.client("kendra")
+s3_client = get_client("s3")
+kendra_client = get_client("kendra")
 
 # Get environment variables
 INDEX_ID = os.environ.get("KENDRA_INDEX_ID")
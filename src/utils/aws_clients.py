@@ -0,0 +1,55 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Connections kept per client, sized for concurrent clients, sections and Kendra calls
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "50"))
+
+# Attempts per call, including the first one, under the adaptive retry mode
+MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "5"))
+
+# Shared botocore configuration of every client
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "total_max_attempts": MAX_ATTEMPTS},
+)
+
+# Clients are module-level so they survive across warm Lambda invocations
+_session = boto3.session.Session()
+_clients: Dict[Tuple[str, Optional[str]], Any] = {}
+_lock = threading.Lock()
+
+
+def get_client(service_name: str, region_name: Optional[str] = None) -> Any:
+    """
+    Get a shared boto3 client for a service and region, creating it on first use.
+
+    boto3 clients are thread-safe, so one client per service and region is
+    reused by every caller instead of paying the construction cost per call.
+
+    Args:
+        service_name (str): The AWS service name, e.g. "kendra" or "bedrock-agent".
+        region_name (Optional[str]): The AWS region. Defaults to the session's region.
+
+    Returns:
+        Any: The boto3 client.
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    # Session client creation is not thread-safe, so build clients under the lock
+    with _lock:
+        if key not in _clients:
+            _clients[key] = _session.client(
+                service_name, region_name=region_name, config=CLIENT_CONFIG
+            )
+        return _clients[key]
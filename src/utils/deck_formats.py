@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from src.utils.document_model import Section, parse_deck
+from src.utils.pdf_formatter import SECTION_TITLES, render_document, upload_bytes
+from src.utils.pptx_formatter import PPTX_CONTENT_TYPE, render_pptx
+
+# Renderer and MIME type of every output format, keyed by file extension
+DECK_FORMATS = {
+    "pdf": (render_document, "application/pdf"),
+    "pptx": (render_pptx, PPTX_CONTENT_TYPE),
+}
+
+
+def parse_output_formats(value: str) -> List[str]:
+    """
+    Parse a comma-separated list of output formats, e.g. "pdf,pptx".
+
+    :param value: The formats, typically from DECK_OUTPUT_FORMATS
+    :return: The formats in the given order, without duplicates
+    :raises ValueError: If a format is unknown or none is given
+    """
+    formats = []
+    for output_format in value.split(","):
+        output_format = output_format.strip().lower()
+        if not output_format or output_format in formats:
+            continue
+        if output_format not in DECK_FORMATS:
+            raise ValueError(
+                f"Unknown deck output format '{output_format}', "
+                f"expected one of {', '.join(DECK_FORMATS)}"
+            )
+        formats.append(output_format)
+    if not formats:
+        raise ValueError("No deck output format is configured")
+    return formats
+
+
+def parse_sections(sections: Dict[str, str]) -> List[Section]:
+    """
+    Parse the generated sections of a deck once, for every renderer.
+
+    :param sections: The generated text keyed by section name, in deck order
+    :return: The parsed sections, titled after SECTION_TITLES
+    """
+    return parse_deck(
+        {SECTION_TITLES.get(name, name): text for name, text in sections.items()}
+    )
+
+
+def render_format(output_format: str, document: List[Section]) -> bytes:
+    """
+    Render a parsed deck in one output format.
+
+    :param output_format: The format to render, a key of DECK_FORMATS
+    :param document: The sections parsed by parse_sections
+    :return: The rendered document
+    """
+    renderer, _ = DECK_FORMATS[output_format]
+    return renderer(document)
+
+
+def upload_deck(files: Dict[str, bytes], client_id: str) -> Dict[str, Optional[str]]:
+    """
+    Upload every rendered format of a deck in one concurrent batch.
+
+    All files share the timestamp in their name, so the formats of one run can
+    be matched up in the bucket.
+
+    :param files: The rendered documents keyed by format
+    :param client_id: The client the deck belongs to
+    :return: The S3 key of each format, or None where the upload failed
+    """
+    # Generate timestamp for filename for avoiding overwriting
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+
+    with ThreadPoolExecutor(max_workers=max(1, len(files))) as executor:
+        uploads = {
+            output_format: executor.submit(
+                upload_bytes,
+                data,
+                f"output/IC_deck_{client_id}_{timestamp}.{output_format}",
+                DECK_FORMATS[output_format][1],
+            )
+            for output_format, data in files.items()
+        }
+        return {
+            output_format: upload.result() for output_format, upload in uploads.items()
+        }
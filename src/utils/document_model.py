@@ -0,0 +1,194 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Kinds of blocks in a parsed section
+HEADING = "heading"
+NUMBERED = "numbered"
+BULLET = "bullet"
+LABEL = "label"
+PARAGRAPH = "paragraph"
+TABLE = "table"
+
+# Classifies a line in one match: indentation, then an optional marker
+LINE_PATTERN = re.compile(
+    r"""
+    (?P<indent>[ \t]*)
+    (?:
+        (?P<heading>\#{1,6})[ \t]+
+      | (?P<number>\d+[.)])(?:[ \t]+|$)
+      | (?P<bullet>[-*+•])[ \t]+
+      | (?P<table>\|)
+    )?
+    (?P<text>.*)
+    """,
+    re.VERBOSE,
+)
+
+# Bold runs delimited by double asterisks or underscores
+BOLD_PATTERN = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+
+# Horizontal rule, e.g. --- or ***
+RULE_PATTERN = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+
+# Separator row of a markdown table, e.g. |---|:---:|
+TABLE_SEPARATOR_PATTERN = re.compile(r"^\|?[\s:|-]+\|?$")
+
+
+@dataclass
+class TextRun:
+    """A piece of text with uniform styling."""
+
+    text: str
+    bold: bool = False
+
+
+@dataclass
+class Block:
+    """
+    One element of a parsed section.
+
+    Headings, numbered items, bullets, labels (lines ending in a colon) and
+    paragraphs carry their text as styled runs; tables carry their rows of
+    cell texts instead.
+    """
+
+    kind: str
+    runs: List[TextRun] = field(default_factory=list)
+    # Heading level (1-6) or bullet nesting depth (0 for top-level bullets)
+    level: int = 0
+    # The marker of a numbered item, e.g. "12."
+    number: Optional[str] = None
+    rows: List[List[str]] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        """The plain text of the block."""
+        return "".join(run.text for run in self.runs)
+
+
+@dataclass
+class Section:
+    """A titled section of the deck."""
+
+    title: str
+    blocks: List[Block]
+
+
+def parse_runs(text: str) -> List[TextRun]:
+    """
+    Split a line into plain and bold runs.
+
+    Args:
+        text (str): The line without its block marker.
+
+    Returns:
+        List[TextRun]: The runs, with the bold markers removed.
+    """
+    runs = []
+    position = 0
+    for match in BOLD_PATTERN.finditer(text):
+        if match.start() > position:
+            runs.append(TextRun(text[position : match.start()]))
+        runs.append(TextRun(match.group(1) or match.group(2), bold=True))
+        position = match.end()
+    if position < len(text):
+        runs.append(TextRun(text[position:]))
+
+    # Drop stray markers left by unbalanced bold runs
+    for run in runs:
+        if "**" in run.text:
+            run.text = run.text.replace("**", "")
+    return [run for run in runs if run.text]
+
+
+def parse_section(content: str) -> List[Block]:
+    """
+    Parse the generated markdown of a section into blocks, in a single pass.
+
+    Recognizes "#" headings, numbered items with any number, bullets nested to
+    any depth by indentation (in any indent unit), bold runs, simple pipe tables, labels (lines
+    ending in a colon) and paragraphs of consecutive plain lines. Filler text
+    the model writes before the first "1." item is dropped.
+
+    Args:
+        content (str): The generated text of the section.
+
+    Returns:
+        List[Block]: The blocks of the section, in order.
+    """
+    blocks: List[Block] = []
+    # Blocks before the first "1." item, dropped once that item shows up
+    preamble_open = True
+    # Indent widths of the enclosing bullets of the current list, outermost first
+    bullet_indents: List[int] = []
+
+    for line in content.splitlines():
+        if not line.strip() or RULE_PATTERN.match(line):
+            # A blank line ends a paragraph or table
+            if blocks and blocks[-1].kind in (PARAGRAPH, TABLE):
+                blocks.append(Block(PARAGRAPH))
+            continue
+
+        match = LINE_PATTERN.match(line)
+        indent = len(match.group("indent").expandtabs(4))
+        text = match.group("text").strip()
+
+        if match.group("bullet"):
+            # A bullet is nested under every open bullet indented less than it
+            while bullet_indents and bullet_indents[-1] >= indent:
+                bullet_indents.pop()
+            blocks.append(Block(BULLET, parse_runs(text), level=len(bullet_indents)))
+            bullet_indents.append(indent)
+            continue
+        # Any other line ends the list
+        bullet_indents = []
+
+        if match.group("heading"):
+            blocks.append(
+                Block(HEADING, parse_runs(text), level=len(match.group("heading")))
+            )
+        elif match.group("number"):
+            number = match.group("number")
+            if preamble_open and number[:-1] == "1":
+                # The model's filler before the first item is not part of the section
+                blocks = []
+                preamble_open = False
+            blocks.append(Block(NUMBERED, parse_runs(text), number=number))
+        elif match.group("table"):
+            if TABLE_SEPARATOR_PATTERN.match(line.strip()):
+                continue
+            row = [cell.strip() for cell in line.strip().strip("|").split("|")]
+            if blocks and blocks[-1].kind == TABLE:
+                blocks[-1].rows.append(row)
+            else:
+                blocks.append(Block(TABLE, rows=[row]))
+        elif text.endswith(":"):
+            blocks.append(Block(LABEL, parse_runs(text)))
+        elif blocks and blocks[-1].kind == PARAGRAPH and blocks[-1].runs:
+            # Consecutive plain lines form one paragraph, keeping their line breaks
+            blocks[-1].runs.append(TextRun("\n"))
+            blocks[-1].runs.extend(parse_runs(text))
+        elif blocks and blocks[-1].kind == PARAGRAPH:
+            blocks[-1].runs.extend(parse_runs(text))
+        else:
+            blocks.append(Block(PARAGRAPH, parse_runs(text)))
+
+    # Drop the empty paragraphs left by blank lines
+    return [block for block in blocks if block.kind == TABLE or block.runs]
+
+
+def parse_deck(sections: Dict[str, str]) -> List[Section]:
+    """
+    Parse the generated sections of a deck.
+
+    Args:
+        sections (Dict[str, str]): The generated text keyed by section title, in
+            deck order.
+
+    Returns:
+        List[Section]: The parsed sections.
+    """
+    return [
+        Section(title, parse_section(content)) for title, content in sections.items()
+    ]
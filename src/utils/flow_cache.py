@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+from src.utils.local_state import LOCAL_STATE_DIR, atomic_write
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Default cache directory
+DEFAULT_CACHE_DIR = os.path.join(LOCAL_STATE_DIR, "flow_output_cache")
+
+
+class FlowOutputCache:
+    """
+    A size-bounded, content-addressed disk cache for generated LLM output.
+
+    Each output is stored in its own file named after the SHA-256 hash of
+    everything that determines it (flow, alias, prompt and exact input).
+    When the total size exceeds `max_bytes`, the least recently used files
+    are removed.
+    """
+
+    def __init__(
+        self, directory: Optional[str] = None, max_bytes: Optional[int] = None
+    ):
+        """
+        Initialize the cache directory.
+
+        Args:
+            directory (Optional[str]): Directory holding the cached outputs. Defaults to
+                LLM_CACHE_DIR or /tmp/flow_output_cache.
+            max_bytes (Optional[int]): Maximum total size of the cache. Defaults to
+                LLM_CACHE_MAX_BYTES or 100 MB.
+        """
+        self.directory = directory or os.environ.get("LLM_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(os.environ.get("LLM_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+        )
+
+        # Counters reported by stats()
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        Build the content address of an output.
+
+        Args:
+            *parts (str): Everything the output depends on, e.g. flow ID, alias ID,
+                prompt hash and input data.
+
+        Returns:
+            str: The SHA-256 hash of the parts as a hexadecimal string.
+        """
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached output and mark it as recently used.
+
+        Args:
+            key (str): The content address returned by make_key.
+
+        Returns:
+            Optional[str]: The cached output, or None on a miss.
+        """
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    content = file.read()
+                os.utime(path)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return content
+
+    def put(self, key: str, content: str) -> None:
+        """
+        Store an output and evict the least recently used ones above the size limit.
+
+        Args:
+            key (str): The content address returned by make_key.
+            content (str): The output to store.
+        """
+        path = self._path(key)
+        with self._lock:
+            atomic_write(path, content)
+            self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report the cache counters.
+
+        Returns:
+            Dict[str, int]: The number of hits and misses.
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _path(self, key: str) -> str:
+        """Return the file path of a cache entry."""
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits. The lock must be held."""
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".txt"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        # Remove the oldest entries first
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            os.remove(path)
+            total_size -= size
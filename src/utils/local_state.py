@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+from typing import Any
+
+# Directory of the files persisted between runs; /tmp is the only writable path on Lambda
+LOCAL_STATE_DIR = "/tmp"
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean setting from the environment.
+
+    Args:
+        name (str): The environment variable.
+        default (bool): The value when the variable is unset.
+
+    Returns:
+        bool: True if the variable is "true" in any case, the default if it is unset.
+    """
+    return os.environ.get(name, str(default)).lower() == "true"
+
+
+def atomic_write(path: str, text: str) -> None:
+    """
+    Replace a file with new text, creating its directory if needed.
+
+    The text is written to a temporary file next to the target and moved into
+    place, so a crash never leaves a partial file and readers never see one.
+
+    Args:
+        path (str): The file to write.
+        text (str): The new content.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Unique per process and thread so concurrent writers never share a temporary file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+def atomic_write_json(path: str, data: Any, **kwargs) -> None:
+    """
+    Replace a file with the JSON encoding of a value, see atomic_write.
+
+    Args:
+        path (str): The file to write.
+        data (Any): The value to encode.
+        **kwargs: Options passed to json.dumps, e.g. indent.
+    """
+    atomic_write(path, json.dumps(data, **kwargs))
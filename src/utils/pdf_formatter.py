@@ -1,12 +1,63 @@
 from fpdf import FPDF
+import io
 import os
-import boto3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from src.utils.aws_clients import get_client
+from src.utils.document_model import (
+    HEADING,
+    LABEL,
+    NUMBERED,
+    BULLET,
+    TABLE,
+    Block,
+    Section,
+    parse_deck,
+    parse_section,
+)
 
 # Load environment variables
 load_dotenv()
 
+# Layout of the rendered deck, in millimeters and points
+LINE_HEIGHT = 10
+BULLET_INDENT = 10
+TABLE_ROW_HEIGHT = 8
+HEADING_FONT_SIZES = {1: 16, 2: 14, 3: 13}
+
+# Titles of the deck sections, keyed by section name
+SECTION_TITLES = {
+    "executive_summary": "Executive Summary",
+    "company_overview": "Company Overview",
+    "financial_overview": "Financial Overview",
+}
+
+# Typographic characters models like to emit, mapped to latin-1 equivalents
+LATIN1_REPLACEMENTS = str.maketrans(
+    {
+        "\u2018": "'",
+        "\u2019": "'",
+        "\u201c": '"',
+        "\u201d": '"',
+        "\u2013": "-",
+        "\u2014": "-",
+        "\u2022": "-",
+        "\u2026": "...",
+        "\u00a0": " ",
+    }
+)
+
+# Rendered documents (PDF or PPTX) above this size are uploaded with a multipart
+# transfer; PDF_SPILL_THRESHOLD_BYTES is the former name of the setting
+MULTIPART_UPLOAD_THRESHOLD_BYTES = int(
+    os.environ.get("MULTIPART_UPLOAD_THRESHOLD_BYTES")
+    or os.environ.get("PDF_SPILL_THRESHOLD_BYTES")
+    or str(25 * 1024 * 1024)
+)
+
 
 def text_to_pdf(text_file, pdf_file):
     """
@@ -50,114 +101,317 @@ def save_to_pdf(
     company_overview: str,
     financial_overview: str,
     client_id: str,
-) -> None:
+) -> Optional[str]:
+    """
+    Render the generated text to a PDF in memory and upload it to S3.
+
+    :param executive_summary: Text for the Executive Summary section
+    :param company_overview: Text for the Company Overview section
+    :param financial_overview: Text for the Financial Overview section
+    :param client_id: The client the deck belongs to
+    :return: The S3 key of the uploaded PDF, or None if the upload failed
+    """
+    pdf_bytes = render_pdf(executive_summary, company_overview, financial_overview)
+    return upload_pdf(pdf_bytes, client_id)
+
+
+def render_pdf(
+    executive_summary: str,
+    company_overview: str,
+    financial_overview: str,
+) -> bytes:
     """
-    Save the generated text to a PDF file and upload it to S3.
+    Render the IC deck sections to a PDF in memory.
 
     :param executive_summary: Text for the Executive Summary section
     :param company_overview: Text for the Company Overview section
     :param financial_overview: Text for the Financial Overview section
+    :return: The PDF document
+    """
+    return render_document(
+        parse_deck(
+            {
+                SECTION_TITLES["executive_summary"]: executive_summary,
+                SECTION_TITLES["company_overview"]: company_overview,
+                SECTION_TITLES["financial_overview"]: financial_overview,
+            }
+        )
+    )
+
+
+def render_document(sections: List[Section]) -> bytes:
+    """
+    Render parsed sections to a PDF in memory, one section per page.
+
+    :param sections: The sections parsed by parse_deck
+    :return: The PDF document
+    """
+    pdf = new_pdf()
+    for section in sections:
+        pdf.add_page()
+        add_section(pdf, section)
+    return pdf_to_bytes(pdf)
+
+
+def new_pdf() -> FPDF:
+    """
+    Create an empty deck document.
+
+    :return: The PDF with the deck's page settings
     """
     pdf = FPDF()
-    pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
+    return pdf
+
 
-    # Function to clean the content by removing filler text before the actual content
-    def clean_content(content: str) -> str:
+def pdf_to_bytes(pdf: FPDF) -> bytes:
+    """
+    Render a laid-out PDF to memory.
+
+    :param pdf: The PDF to render
+    :return: The PDF document
+    """
+    # fpdf 1.7 returns a latin-1 string, fpdf2 a bytearray
+    pdf_data = pdf.output(dest="S")
+    if isinstance(pdf_data, str):
+        pdf_data = pdf_data.encode("latin-1")
+    return bytes(pdf_data)
+
+
+class IncrementalDeckBuilder:
+    """
+    Lays out the pages of a deck section by section as the texts arrive.
+
+    Sections may arrive in any order; each is laid out as soon as every section
+    before it in the deck order is, and the document is rendered to bytes when
+    the last one lands. Layout runs on a single background thread, so adding a
+    section returns immediately and never delays the generation of the others.
+    """
+
+    def __init__(
+        self, section_names: List[str], titles: Optional[Dict[str, str]] = None
+    ):
         """
-        Clean the content by removing filler text before the actual content.
+        Initialize the builder.
 
-        The function searches for the first occurrence of "1." in the content and
-        returns the substring starting from that index. If "1." is not found, the
-        function returns the original content.
+        :param section_names: The section names in deck order
+        :param titles: Page titles keyed by section name, defaults to SECTION_TITLES
+        """
+        self.section_names = list(section_names)
+        self.titles = titles or SECTION_TITLES
+        self.pdf = new_pdf()
+        self.pdf_bytes: Optional[bytes] = None
+        # Parsed sections in deck order, for rendering other formats without re-parsing
+        self.sections: List[Section] = []
+        # Arrived texts waiting for the sections before them
+        self._texts: Dict[str, str] = {}
+        self._added = set()
+        self._next_index = 0
+        self._lock = threading.Lock()
+        self._layouts = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="deck-layout"
+        )
 
-        Parameters
-        ----------
-        content : str
-            The content to be cleaned
+    def add_section(self, section_name: str, text: str) -> None:
+        """
+        Hand over the generated text of a section for layout.
 
-        Returns
-        -------
-        str
-            The cleaned content
+        :param section_name: The section the text belongs to
+        :param text: The generated text
+        :raises ValueError: If the section is not part of the deck or was already added
         """
-        start_index = content.find("1.")
-        if start_index != -1:
-            return content[start_index:]
-        return content
-
-    # Function to add a section with a title
-    def add_section(pdf, title, content):
-        pdf.set_font("Arial", "B", 16)  # 'B' for Bold
-        pdf.cell(200, 10, txt=title, ln=True, align="C")
-        pdf.ln(10)
-        pdf.set_font("Arial", "", 12)  # Reset to normal
-        cleaned_content = clean_content(
-            content.replace("**", "")
-        )  # Remove ** and clean content
-        add_formatted_content(pdf, cleaned_content)
-
-    # Function to add formatted content
-    def add_formatted_content(pdf, content):
-        lines = content.split("\n")
-        for line in lines:
-            if (
-                line.startswith("1.")
-                or line.startswith("2.")
-                or line.startswith("3.")
-                or line.startswith("4.")
-                or line.startswith("5.")
-                or line.startswith("6.")
-                or line.startswith("6.")
-                or line.startswith("7.")
-            ):
-                pdf.set_font("Arial", "B", 12)
-                pdf.multi_cell(0, 10, line)
-                pdf.set_font("Arial", "", 12)
-            elif line.startswith("-"):
-                pdf.cell(10)
-                pdf.multi_cell(0, 10, line)
-            elif line.startswith("   -"):
-                pdf.cell(20)
-                pdf.multi_cell(0, 10, line)
-            elif line.strip().endswith(":"):
-                pdf.set_font("Arial", "B", 12)
-                pdf.multi_cell(0, 10, line)
-                pdf.set_font("Arial", "", 12)
-            else:
-                pdf.multi_cell(0, 10, line)
-        pdf.ln(5)
-
-    # Add the Executive Summary section
-    add_section(pdf, "Executive Summary", executive_summary)
-
-    # Add the Company Overview section
-    pdf.add_page()
-    add_section(pdf, "Company Overview", company_overview)
+        with self._lock:
+            if section_name not in self.section_names:
+                raise ValueError(f"Section {section_name} is not part of the deck")
+            if section_name in self._added:
+                raise ValueError(f"Section {section_name} was already added")
+            self._added.add(section_name)
+            self._texts[section_name] = text
+        self._layouts.append(self._executor.submit(self._lay_out_ready))
 
-    # Add the Financial Overview section
-    pdf.add_page()
-    add_section(pdf, "Financial Overview", financial_overview)
+    def finalize(self) -> bytes:
+        """
+        Wait for the layout of every section and return the rendered deck.
 
-    # Save the PDF to a temporary file
-    pdf_file_path = "/tmp/IC_Deck.pdf"
-    pdf.output(pdf_file_path)
-    # pdf.output('IC_Deck.pdf') # uncomment this line only if you are running locally
+        :return: The PDF document
+        :raises ValueError: If sections are missing
+        """
+        self._executor.shutdown(wait=True)
+        # Surface errors raised while laying out
+        for layout in self._layouts:
+            layout.result()
+        if self.pdf_bytes is None:
+            missing = self.section_names[self._next_index :]
+            raise ValueError(f"Deck is missing sections: {', '.join(missing)}")
+        return self.pdf_bytes
 
-    # Upload the PDF to S3
-    s3_client = boto3.client("s3")
-    # Get bucket name from environment variables
-    output_bucket_name = os.getenv("OUTPUT_BUCKET_NAME")
+    def close(self) -> None:
+        """Stop the layout thread, e.g. after generation failed."""
+        self._executor.shutdown(wait=False)
 
-    # Generate timestamp for filename for avoiding overwriting
+    def _lay_out_ready(self) -> None:
+        """Lay out every arrived section whose predecessors are laid out."""
+        while True:
+            with self._lock:
+                if self._next_index == len(self.section_names):
+                    break
+                section_name = self.section_names[self._next_index]
+                if section_name not in self._texts:
+                    return
+                text = self._texts.pop(section_name)
+
+            section = Section(self.titles[section_name], parse_section(text))
+            self.pdf.add_page()
+            add_section(self.pdf, section)
+            self.sections.append(section)
+            with self._lock:
+                self._next_index += 1
+
+        # The last section landed
+        if self.pdf_bytes is None:
+            self.pdf_bytes = pdf_to_bytes(self.pdf)
+
+
+def add_section(pdf: FPDF, section: Section) -> None:
+    """
+    Add a section with a centered title to the current page.
+
+    :param pdf: The PDF being rendered
+    :param section: The parsed section
+    """
+    pdf.set_font("Arial", "B", 16)  # 'B' for Bold
+    pdf.cell(200, 10, txt=to_latin1(section.title), ln=True, align="C")
+    pdf.ln(10)
+
+    for block in section.blocks:
+        if block.kind == TABLE:
+            add_table(pdf, block.rows)
+        else:
+            add_text_block(pdf, block)
+    pdf.ln(5)
+
+
+def add_text_block(pdf: FPDF, block: Block) -> None:
+    """
+    Add a heading, numbered item, bullet, label or paragraph.
+
+    Headings, numbered items and labels are bold; bullets are indented by
+    their nesting depth. Bold runs inside the text keep their styling.
+
+    :param pdf: The PDF being rendered
+    :param block: The block to add
+    """
+    bold = block.kind in (HEADING, NUMBERED, LABEL)
+    font_size = HEADING_FONT_SIZES.get(block.level, 12) if block.kind == HEADING else 12
+
+    # Indent bullets by their depth through the left margin, so wrapped lines align
+    left_margin = pdf.l_margin
+    prefix = ""
+    if block.kind == NUMBERED:
+        prefix = f"{block.number} "
+    elif block.kind == BULLET:
+        pdf.set_left_margin(left_margin + BULLET_INDENT * (block.level + 1))
+        prefix = "- "
+    pdf.set_x(pdf.l_margin)
+
+    if prefix:
+        pdf.set_font("Arial", "B" if bold else "", font_size)
+        pdf.write(LINE_HEIGHT, prefix)
+    for run in block.runs:
+        pdf.set_font("Arial", "B" if bold or run.bold else "", font_size)
+        pdf.write(LINE_HEIGHT, to_latin1(run.text))
+    pdf.ln(LINE_HEIGHT)
+
+    pdf.set_left_margin(left_margin)
+
+
+def add_table(pdf: FPDF, rows: List[List[str]]) -> None:
+    """
+    Add a table with equally wide columns, the first row in bold.
 
+    :param pdf: The PDF being rendered
+    :param rows: The cell texts of every row
+    """
+    column_count = max(len(row) for row in rows)
+    column_width = (pdf.w - pdf.l_margin - pdf.r_margin) / column_count
+
+    for index, row in enumerate(rows):
+        pdf.set_font("Arial", "B" if index == 0 else "", 10)
+        for column in range(column_count):
+            text = to_latin1(row[column]) if column < len(row) else ""
+            # Shorten cell texts that do not fit their column
+            while text and pdf.get_string_width(text) > column_width - 2:
+                text = text[:-1]
+            pdf.cell(column_width, TABLE_ROW_HEIGHT, text, border=1)
+        pdf.ln(TABLE_ROW_HEIGHT)
+    pdf.ln(5)
+
+
+def to_latin1(text: str) -> str:
+    """
+    Make text printable with the built-in PDF fonts, which only cover latin-1.
+
+    :param text: The text to convert
+    :return: The text with typographic punctuation replaced and other characters
+        outside latin-1 shown as "?"
+    """
+    return (
+        text.translate(LATIN1_REPLACEMENTS)
+        .encode("latin-1", "replace")
+        .decode("latin-1")
+    )
+
+
+def upload_pdf(pdf_bytes: bytes, client_id: str) -> Optional[str]:
+    """
+    Upload a rendered IC deck to the output bucket.
+
+    :param pdf_bytes: The PDF document
+    :param client_id: The client the deck belongs to
+    :return: The S3 key of the uploaded PDF, or None if the upload failed
+    """
+    # Generate timestamp for filename for avoiding overwriting
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"IC_deck_{client_id}_{timestamp}.pdf"
-    s3_key = f"output/{filename}"
+    s3_key = f"output/IC_deck_{client_id}_{timestamp}.pdf"
+    return upload_bytes(pdf_bytes, s3_key, "application/pdf")
+
+
+def upload_bytes(data: bytes, s3_key: str, content_type: str) -> Optional[str]:
+    """
+    Upload a rendered document to the output bucket.
+
+    Documents up to MULTIPART_UPLOAD_THRESHOLD_BYTES are sent with one put_object call.
+    Larger ones go through the managed multipart transfer, streamed from the
+    bytes already in memory.
+
+    :param data: The document
+    :param s3_key: The key to upload the document to
+    :param content_type: The MIME type of the document
+    :return: The S3 key of the uploaded document, or None if the upload failed
+    """
+    s3_client = get_client("s3")
+    # Get bucket name from environment variables
+    output_bucket_name = os.getenv("OUTPUT_BUCKET_NAME")
 
-    # Upload the PDF to S3
+    # Upload the document to S3
     try:
-        s3_client.upload_file(pdf_file_path, output_bucket_name, s3_key)
-        print(f"PDF successfully uploaded to s3://{output_bucket_name}/{s3_key}")
+        if len(data) <= MULTIPART_UPLOAD_THRESHOLD_BYTES:
+            s3_client.put_object(
+                Bucket=output_bucket_name,
+                Key=s3_key,
+                Body=data,
+                ContentType=content_type,
+            )
+        else:
+            s3_client.upload_fileobj(
+                io.BytesIO(data),
+                output_bucket_name,
+                s3_key,
+                ExtraArgs={"ContentType": content_type},
+            )
+        print(f"Successfully uploaded to s3://{output_bucket_name}/{s3_key}")
+        return s3_key
     except Exception as e:
-        print(f"Error uploading PDF to S3: {str(e)}")
+        print(f"Error uploading {s3_key} to S3: {str(e)}")
+        return None
@@ -0,0 +1,192 @@
+import io
+import math
+from typing import List, Tuple
+from pptx import Presentation
+from pptx.util import Inches, Pt
+from src.utils.document_model import (
+    HEADING,
+    LABEL,
+    NUMBERED,
+    BULLET,
+    TABLE,
+    Block,
+    Section,
+)
+
+PPTX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+)
+
+# Index of the "Title Only" layout in the default template
+TITLE_ONLY_LAYOUT = 5
+
+# Capacity of a text slide in wrapped lines, and of a line in characters
+LINES_PER_SLIDE = 14
+CHARS_PER_LINE = 90
+TABLE_ROWS_PER_SLIDE = 10
+
+# Body text sizes in points
+BODY_FONT_SIZE = 14
+TABLE_FONT_SIZE = 12
+HEADING_FONT_SIZES = {1: 20, 2: 18, 3: 16}
+
+# Body area below the title, in inches
+BODY_LEFT = 0.5
+BODY_TOP = 1.5
+BODY_WIDTH = 9.0
+BODY_HEIGHT = 5.5
+
+
+def render_pptx(sections: List[Section]) -> bytes:
+    """
+    Render parsed sections to a slide deck in memory.
+
+    Each section starts on a new slide titled after it. Text blocks flow onto
+    continuation slides when a slide is full; every table gets slides of its
+    own, repeating the header row.
+
+    :param sections: The sections parsed by parse_deck
+    :return: The PPTX document
+    """
+    presentation = Presentation()
+
+    for section in sections:
+        for title, blocks in paginate(section):
+            slide = presentation.slides.add_slide(
+                presentation.slide_layouts[TITLE_ONLY_LAYOUT]
+            )
+            slide.shapes.title.text = title
+            if blocks and blocks[0].kind == TABLE:
+                add_table(slide, blocks[0].rows)
+            else:
+                add_text_blocks(slide, blocks)
+
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def paginate(section: Section) -> List[Tuple[str, List[Block]]]:
+    """
+    Split a section into slides.
+
+    :param section: The parsed section
+    :return: A (title, blocks) pair per slide; a table slide holds one table block
+    """
+    slides = []
+    blocks: List[Block] = []
+    lines = 0
+
+    def flush():
+        nonlocal blocks, lines
+        if blocks:
+            slides.append((slide_title(section.title, len(slides)), blocks))
+        blocks, lines = [], 0
+
+    for block in section.blocks:
+        if block.kind == TABLE:
+            flush()
+            header, body = block.rows[0], block.rows[1:]
+            for start in range(0, max(len(body), 1), TABLE_ROWS_PER_SLIDE):
+                rows = [header] + body[start : start + TABLE_ROWS_PER_SLIDE]
+                slides.append(
+                    (slide_title(section.title, len(slides)), [Block(TABLE, rows=rows)])
+                )
+            continue
+
+        block_lines = sum(
+            max(1, math.ceil(len(line) / CHARS_PER_LINE))
+            for line in block.text.split("\n")
+        )
+        if lines and lines + block_lines > LINES_PER_SLIDE:
+            flush()
+        blocks.append(block)
+        lines += block_lines
+    flush()
+
+    # A section without content still gets its title slide
+    return slides or [(section.title, [])]
+
+
+def slide_title(title: str, index: int) -> str:
+    """
+    Title a slide of a section, marking continuation slides.
+
+    :param title: The section title
+    :param index: Position of the slide within the section
+    :return: The slide title
+    """
+    return title if index == 0 else f"{title} (cont.)"
+
+
+def add_text_blocks(slide, blocks: List[Block]) -> None:
+    """
+    Add headings, numbered items, bullets, labels and paragraphs to a slide.
+
+    Mirrors the PDF: headings, numbered items and labels are bold, bullets are
+    indented by their nesting depth and bold runs keep their styling.
+
+    :param slide: The slide to add the text to
+    :param blocks: The text blocks, in order
+    """
+    text_frame = slide.shapes.add_textbox(
+        Inches(BODY_LEFT), Inches(BODY_TOP), Inches(BODY_WIDTH), Inches(BODY_HEIGHT)
+    ).text_frame
+    text_frame.word_wrap = True
+
+    for index, block in enumerate(blocks):
+        paragraph = (
+            text_frame.paragraphs[0] if index == 0 else text_frame.add_paragraph()
+        )
+        bold = block.kind in (HEADING, NUMBERED, LABEL)
+        font_size = (
+            HEADING_FONT_SIZES.get(block.level, BODY_FONT_SIZE)
+            if block.kind == HEADING
+            else BODY_FONT_SIZE
+        )
+
+        prefix = ""
+        if block.kind == NUMBERED:
+            prefix = f"{block.number} "
+        elif block.kind == BULLET:
+            # Text boxes indent each level by half an inch
+            paragraph.level = min(block.level + 1, 8)
+            prefix = "- "
+
+        runs = [(prefix, bold)] if prefix else []
+        runs.extend((run.text, bold or run.bold) for run in block.runs)
+        for text, run_bold in runs:
+            # Lines of a paragraph are joined by "\n" runs
+            if text == "\n":
+                paragraph.add_line_break()
+                continue
+            run = paragraph.add_run()
+            run.text = text
+            run.font.bold = run_bold
+            run.font.size = Pt(font_size)
+
+
+def add_table(slide, rows: List[List[str]]) -> None:
+    """
+    Add a table with equally wide columns, the first row in bold.
+
+    :param slide: The slide to add the table to
+    :param rows: The cell texts of every row
+    """
+    column_count = max(len(row) for row in rows)
+    table = slide.shapes.add_table(
+        len(rows),
+        column_count,
+        Inches(BODY_LEFT),
+        Inches(BODY_TOP),
+        Inches(BODY_WIDTH),
+        Inches(0.4 * len(rows)),
+    ).table
+
+    for row_index, row in enumerate(rows):
+        for column in range(column_count):
+            text_frame = table.cell(row_index, column).text_frame
+            text_frame.text = row[column] if column < len(row) else ""
+            for run in text_frame.paragraphs[0].runs:
+                run.font.size = Pt(TABLE_FONT_SIZE)
+                run.font.bold = row_index == 0
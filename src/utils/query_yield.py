@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from src.utils.local_state import LOCAL_STATE_DIR, atomic_write_json
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Default location of the persisted statistics
+DEFAULT_YIELD_PATH = os.path.join(LOCAL_STATE_DIR, "query_yield.json")
+
+
+class QueryYieldTracker:
+    """
+    Per-section statistics of how many new passages each retrieval query adds.
+
+    For every (section, query) pair the tracker counts the runs, the passages
+    returned, the passages no other query of the run returned and the runs in
+    which the query was skipped. The statistics are persisted to a JSON file so
+    later runs can issue the most productive queries first.
+
+    Earlier runs weigh less with every new measurement, so the order follows
+    changes in the documents. A query skipped in several consecutive runs is
+    issued first again, so a low first measurement cannot lock it out.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        decay: Optional[float] = None,
+        explore_after: Optional[int] = None,
+    ):
+        """
+        Initialize the tracker and load the persisted statistics.
+
+        Args:
+            path (Optional[str]): Path of the JSON file. Defaults to QUERY_YIELD_PATH or
+                /tmp/query_yield.json.
+            decay (Optional[float]): Weight of the earlier counts when a query is
+                measured again. Defaults to QUERY_YIELD_DECAY or 0.7.
+            explore_after (Optional[int]): Consecutive skips after which a query is
+                measured again. Defaults to ADAPTIVE_EXPLORE_AFTER or 3.
+        """
+        self.path = path or os.environ.get("QUERY_YIELD_PATH", DEFAULT_YIELD_PATH)
+        self.decay = (
+            decay
+            if decay is not None
+            else float(os.environ.get("QUERY_YIELD_DECAY", "0.7"))
+        )
+        self.explore_after = max(
+            1,
+            (
+                explore_after
+                if explore_after is not None
+                else int(os.environ.get("ADAPTIVE_EXPLORE_AFTER", "3"))
+            ),
+        )
+        self._stats: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def record(self, section_name: str, query: str, returned: int, new: int) -> None:
+        """
+        Record the outcome of a query.
+
+        Args:
+            section_name (str): The section the query was issued for.
+            query (str): The query text.
+            returned (int): Number of passages the query returned.
+            new (int): Number of those passages no other query of the run returned.
+        """
+        with self._lock:
+            entry = self._entry(section_name, query)
+            entry["runs"] += 1
+            entry["returned"] = round(entry["returned"] * self.decay + returned, 3)
+            entry["new"] = round(entry["new"] * self.decay + new, 3)
+            entry["skip_streak"] = 0
+
+    def record_skipped(self, section_name: str, query: str) -> None:
+        """
+        Record that a query was skipped because the section's coverage saturated.
+
+        Args:
+            section_name (str): The section the query belongs to.
+            query (str): The query text.
+        """
+        with self._lock:
+            entry = self._entry(section_name, query)
+            entry["skipped"] += 1
+            entry["skip_streak"] += 1
+
+    def yield_ratio(self, section_name: str, query: str) -> Optional[float]:
+        """
+        Compute the historical share of new passages among a query's results.
+
+        Args:
+            section_name (str): The section the query belongs to.
+            query (str): The query text.
+
+        Returns:
+            Optional[float]: The ratio, or None if the query never ran.
+        """
+        with self._lock:
+            entry = self._stats.get(section_name, {}).get(query)
+            if not entry or not entry["runs"]:
+                return None
+            return entry["new"] / max(entry["returned"], 1)
+
+    def order(self, section_name: str, queries: List[str]) -> List[str]:
+        """
+        Order a section's queries by descending historical yield.
+
+        Queries that never ran or were skipped in the last `explore_after` runs
+        come first, so they get measured; ties keep the configured order.
+
+        Args:
+            section_name (str): The section the queries belong to.
+            queries (List[str]): The queries in their configured order.
+
+        Returns:
+            List[str]: The queries, most productive first.
+        """
+        ratios = {query: self.yield_ratio(section_name, query) for query in queries}
+        with self._lock:
+            section_stats = self._stats.get(section_name, {})
+            for query in queries:
+                entry = section_stats.get(query)
+                if entry and entry.get("skip_streak", 0) >= self.explore_after:
+                    ratios[query] = None
+        return sorted(
+            queries,
+            key=lambda query: -1.0 if ratios[query] is None else -ratios[query],
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Report the statistics of every query.
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: Per section and query the runs,
+            the decayed returned and new counts, the skipped count, the current
+            streak of skips and the yield ratio.
+        """
+        with self._lock:
+            return {
+                section_name: {
+                    query: {
+                        **entry,
+                        "yield": round(entry["new"] / max(entry["returned"], 1), 3),
+                    }
+                    for query, entry in queries.items()
+                }
+                for section_name, queries in self._stats.items()
+            }
+
+    def save(self) -> None:
+        """Persist the statistics."""
+        with self._lock:
+            atomic_write_json(self.path, self._stats)
+
+    def _entry(self, section_name: str, query: str) -> Dict[str, float]:
+        """Return the counters of a query, creating them if needed. The lock must be held."""
+        entry = self._stats.setdefault(section_name, {}).setdefault(
+            query, {"runs": 0, "returned": 0, "new": 0, "skipped": 0}
+        )
+        # Statistics saved before skip streaks were tracked lack the counter
+        entry.setdefault("skip_streak", 0)
+        return entry
+
+    def _load(self) -> None:
+        """Load the persisted statistics if they exist."""
+        try:
+            with open(self.path, "r") as file:
+                self._stats = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._stats = {}
@@ -0,0 +1,326 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.utils.local_state import LOCAL_STATE_DIR
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Default location of the SQLite file
+DEFAULT_CACHE_PATH = os.path.join(LOCAL_STATE_DIR, "retrieval_cache.sqlite3")
+
+
+class RetrievalCache:
+    """
+    A persistent cache for Kendra retrieve results.
+
+    Entries are keyed by (index_id, client_id, query, page) and stored in a SQLite
+    file so they survive across runs and warm Lambda invocations. Entries
+    expire after a TTL and the least recently used ones are evicted once the
+    cache holds more than `max_entries`. Concurrent lookups of the same key
+    share a single fetch, so identical queries issued by several sections
+    only hit Kendra once.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        """
+        Initialize the cache and create its table if needed.
+
+        Args:
+            path (Optional[str]): Path of the SQLite file. Defaults to RETRIEVAL_CACHE_PATH
+                or /tmp/retrieval_cache.sqlite3.
+            ttl_seconds (Optional[float]): Lifetime of an entry. Defaults to
+                RETRIEVAL_CACHE_TTL_SECONDS or one day.
+            max_entries (Optional[int]): Maximum number of entries kept. Defaults to
+                RETRIEVAL_CACHE_MAX_ENTRIES or 10000.
+        """
+        self.path = path or os.environ.get("RETRIEVAL_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.environ.get("RETRIEVAL_CACHE_TTL_SECONDS", "86400"))
+        )
+        self.max_entries = (
+            max_entries
+            if max_entries is not None
+            else int(os.environ.get("RETRIEVAL_CACHE_MAX_ENTRIES", "10000"))
+        )
+
+        # Counters reported by stats()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        # Fetches currently in progress, keyed like the cache entries
+        self._inflight: Dict[Tuple[str, str, str], Future] = {}
+        self._lock = threading.Lock()
+
+        # Create the directory and the table
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS retrieval_cache (
+                index_id TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                query TEXT NOT NULL,
+                results TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (index_id, client_id, query)
+            )
+            """)
+        self._connection.commit()
+
+    @classmethod
+    def make_key(
+        cls,
+        index_id: str,
+        client_id: str,
+        query: str,
+        page_number: int = 1,
+        page_size: Optional[int] = None,
+    ) -> Tuple[str, str, str]:
+        """
+        Build the key of an entry.
+
+        Args:
+            index_id (str): The Kendra index ID.
+            client_id (str): The client the query was filtered on.
+            query (str): The query text.
+            page_number (int): The page of the results. Defaults to 1.
+            page_size (Optional[int]): The page size, None for the service default.
+
+        Returns:
+            Tuple[str, str, str]: The index ID, client ID and the normalized query,
+            suffixed with the page unless it is the first page of the default size.
+        """
+        query = cls.normalize_query(query)
+        if page_number != 1 or page_size is not None:
+            query = f"{query}\x1fpage={page_number}\x1fsize={page_size}"
+        return (index_id, client_id, query)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        Normalize a query so trivially different spellings share an entry.
+
+        Args:
+            query (str): The query text.
+
+        Returns:
+            str: The lower-cased query with collapsed whitespace.
+        """
+        return " ".join(query.lower().split())
+
+    def get(
+        self,
+        index_id: str,
+        client_id: str,
+        query: str,
+        page_number: int = 1,
+        page_size: Optional[int] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Look up the cached results of a query.
+
+        Args:
+            index_id (str): The Kendra index ID.
+            client_id (str): The client the query was filtered on.
+            query (str): The query text.
+            page_number (int): The page of the results. Defaults to 1.
+            page_size (Optional[int]): The page size, None for the service default.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: The cached results, or None if there is
+            no fresh entry.
+        """
+        key = self.make_key(index_id, client_id, query, page_number, page_size)
+        with self._lock:
+            return self._get_locked(key)
+
+    def put(
+        self,
+        index_id: str,
+        client_id: str,
+        query: str,
+        results: List[Dict[str, Any]],
+        page_number: int = 1,
+        page_size: Optional[int] = None,
+    ) -> None:
+        """
+        Store the results of a query and evict the least recently used entries.
+
+        Args:
+            index_id (str): The Kendra index ID.
+            client_id (str): The client the query was filtered on.
+            query (str): The query text.
+            results (List[Dict[str, Any]]): The results to cache.
+            page_number (int): The page of the results. Defaults to 1.
+            page_size (Optional[int]): The page size, None for the service default.
+        """
+        key = self.make_key(index_id, client_id, query, page_number, page_size)
+        with self._lock:
+            self._put_locked(key, results)
+
+    def get_or_fetch(
+        self,
+        index_id: str,
+        client_id: str,
+        query: str,
+        fetch: Callable[[], List[Dict[str, Any]]],
+        page_number: int = 1,
+        page_size: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the cached results of a query, fetching and caching them on a miss.
+
+        If another thread is already fetching the same key, this call waits for
+        that fetch instead of issuing a second one. Exceptions raised by `fetch`
+        are propagated and nothing is cached.
+
+        Args:
+            index_id (str): The Kendra index ID.
+            client_id (str): The client the query is filtered on.
+            query (str): The query text.
+            fetch (Callable[[], List[Dict[str, Any]]]): Performs the actual retrieval.
+            page_number (int): The page of the results. Defaults to 1.
+            page_size (Optional[int]): The page size, None for the service default.
+
+        Returns:
+            List[Dict[str, Any]]: The results of the query.
+        """
+        key = self.make_key(index_id, client_id, query, page_number, page_size)
+
+        with self._lock:
+            cached = self._get_locked(key)
+            if cached is not None:
+                return cached
+
+            # Join a fetch of the same key that is already in progress
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        # Wait for the thread that owns the fetch
+        if not is_owner:
+            return future.result()
+
+        try:
+            results = fetch()
+            with self._lock:
+                self._put_locked(key, results)
+            future.set_result(results)
+            return results
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def invalidate_client(
+        self, index_id: str, client_id: str, before: Optional[float] = None
+    ) -> int:
+        """
+        Remove the cached entries of a client.
+
+        Args:
+            index_id (str): The Kendra index ID.
+            client_id (str): The client whose entries are removed.
+            before (Optional[float]): Only remove entries created before this UNIX
+                timestamp, e.g. the end time of the client's latest sync job.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        with self._lock:
+            if before is None:
+                cursor = self._connection.execute(
+                    "DELETE FROM retrieval_cache WHERE index_id = ? AND client_id = ?",
+                    (index_id, client_id),
+                )
+            else:
+                cursor = self._connection.execute(
+                    "DELETE FROM retrieval_cache "
+                    "WHERE index_id = ? AND client_id = ? AND created_at < ?",
+                    (index_id, client_id, before),
+                )
+            self._connection.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report the cache counters.
+
+        Returns:
+            Dict[str, int]: The number of hits, misses and coalesced fetches.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def _get_locked(self, key: Tuple[str, str, str]) -> Optional[List[Dict[str, Any]]]:
+        """Look up a fresh entry and mark it as recently used. The lock must be held."""
+        now = time.time()
+        row = self._connection.execute(
+            "SELECT results, created_at FROM retrieval_cache "
+            "WHERE index_id = ? AND client_id = ? AND query = ?",
+            key,
+        ).fetchone()
+
+        # Treat missing and expired entries as misses
+        if row is None or now - row[1] > self.ttl_seconds:
+            self.misses += 1
+            return None
+
+        self._connection.execute(
+            "UPDATE retrieval_cache SET accessed_at = ? "
+            "WHERE index_id = ? AND client_id = ? AND query = ?",
+            (now, *key),
+        )
+        self._connection.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def _put_locked(
+        self, key: Tuple[str, str, str], results: List[Dict[str, Any]]
+    ) -> None:
+        """Store an entry and evict expired and least recently used ones. The lock must be held."""
+        now = time.time()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO retrieval_cache "
+            "(index_id, client_id, query, results, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (*key, json.dumps(results), now, now),
+        )
+
+        # Drop expired entries, then the least recently used ones above the limit
+        self._connection.execute(
+            "DELETE FROM retrieval_cache WHERE created_at < ?",
+            (now - self.ttl_seconds,),
+        )
+        self._connection.execute(
+            "DELETE FROM retrieval_cache WHERE rowid IN ("
+            "SELECT rowid FROM retrieval_cache ORDER BY accessed_at DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._connection.commit()
@@ -1,8 +1,8 @@
-import boto3
 from botocore.exceptions import ClientError
 import os
 from typing import List
 from dotenv import load_dotenv
+from src.utils.aws_clients import get_client
 
 # Load environment variables
 load_dotenv()
@@ -19,7 +19,7 @@ class S3BucketManager:
         """
         self.region_name = region_name
         # Initialize S3 client
-        self.s3_client = boto3.client("s3", region_name=self.region_name)
+        self.s3_client = get_client("s3", region_name=self.region_name)
         self.bucket_name = bucket_name
 
     def create_bucket_with_config(self) -> bool: